@@ -0,0 +1,69 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+# SQL полнотекстового индекса записан здесь, а не импортируется из
+# shopapp.search, чтобы правки модуля не меняли историю миграций.
+SQLITE_CREATE_FTS = [
+    "CREATE VIRTUAL TABLE blogapp_article_fts USING fts5("
+    "title, content, content='blogapp_article', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER blogapp_article_fts_ai AFTER INSERT ON blogapp_article BEGIN "
+    "INSERT INTO blogapp_article_fts (rowid, title, content) "
+    "VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER blogapp_article_fts_ad AFTER DELETE ON blogapp_article BEGIN "
+    "INSERT INTO blogapp_article_fts (blogapp_article_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER blogapp_article_fts_au AFTER UPDATE OF title, content ON blogapp_article BEGIN "
+    "INSERT INTO blogapp_article_fts (blogapp_article_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO blogapp_article_fts (rowid, title, content) "
+    "VALUES (new.id, new.title, new.content); END",
+    "INSERT INTO blogapp_article_fts (blogapp_article_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_FTS = [
+    "DROP TRIGGER IF EXISTS blogapp_article_fts_ai",
+    "DROP TRIGGER IF EXISTS blogapp_article_fts_ad",
+    "DROP TRIGGER IF EXISTS blogapp_article_fts_au",
+    "DROP TABLE IF EXISTS blogapp_article_fts",
+]
+POSTGRESQL_CREATE_FTS = [
+    "ALTER TABLE blogapp_article ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', "
+    "coalesce(title, '') || ' ' || coalesce(content, ''))) STORED",
+    "CREATE INDEX blogapp_article_search_vector_idx ON blogapp_article USING GIN (search_vector)",
+]
+POSTGRESQL_DROP_FTS = [
+    "ALTER TABLE blogapp_article DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_statements(statements):
+    """Операция для RunPython: statements - {vendor: [SQL]}, остальные СУБД пропускаются."""
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+
+    return run
+
+
+create_fts = run_statements(
+    {"sqlite": SQLITE_CREATE_FTS, "postgresql": POSTGRESQL_CREATE_FTS}
+)
+drop_fts = run_statements({"sqlite": SQLITE_DROP_FTS, "postgresql": POSTGRESQL_DROP_FTS})
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blogapp", "0005_alter_category_options"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="article",
+            name="content",
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+# SQL полнотекстового индекса записан здесь, а не импортируется из
+# shopapp.search, чтобы правки модуля не меняли историю миграций.
+SQLITE_CREATE_FTS = [
+    "CREATE VIRTUAL TABLE blogapp_article_fts USING fts5("
+    "title, content, content='blogapp_article', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER blogapp_article_fts_ai AFTER INSERT ON blogapp_article BEGIN "
+    "INSERT INTO blogapp_article_fts (rowid, title, content) "
+    "VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER blogapp_article_fts_ad AFTER DELETE ON blogapp_article BEGIN "
+    "INSERT INTO blogapp_article_fts (blogapp_article_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER blogapp_article_fts_au AFTER UPDATE OF title, content ON blogapp_article BEGIN "
+    "INSERT INTO blogapp_article_fts (blogapp_article_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO blogapp_article_fts (rowid, title, content) "
+    "VALUES (new.id, new.title, new.content); END",
+    "INSERT INTO blogapp_article_fts (blogapp_article_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_FTS = [
+    "DROP TRIGGER IF EXISTS blogapp_article_fts_ai",
+    "DROP TRIGGER IF EXISTS blogapp_article_fts_ad",
+    "DROP TRIGGER IF EXISTS blogapp_article_fts_au",
+    "DROP TABLE IF EXISTS blogapp_article_fts",
+]
+
+
+def sqlite_statements(statements):
+    """На SQLite AddField пересоздаёт таблицу, и триггеры FTS5 теряются."""
+
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return run
+
+
+def fill_updated_at(apps, schema_editor):
+    Article = apps.get_model("blogapp", "Article")
+    Article.objects.update(updated_at=F("pub_date"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blogapp", "0006_article_fts"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            sqlite_statements(SQLITE_DROP_FTS), sqlite_statements(SQLITE_CREATE_FTS)
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["updated_at", "id"], name="blogapp_article_updated_idx"
+            ),
+        ),
+        migrations.RunPython(
+            sqlite_statements(SQLITE_CREATE_FTS), sqlite_statements(SQLITE_DROP_FTS)
+        ),
+    ]
@@ -52,9 +52,15 @@ class Article(models.Model):
     Модель Article представляет собой статью.
     """
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='blogapp_article_updated_idx'),
+        ]
+
     title = models.CharField(max_length=200, db_index=True)
-    content = models.TextField(null=False, blank=True, db_index=True)
+    content = models.TextField(null=False, blank=True)
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(Author, null=True, blank=True, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.CASCADE)
     tags = models.ManyToManyField(Tag)
@@ -0,0 +1,18 @@
+from rest_framework import serializers
+
+from .models import Article
+
+
+class ArticleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Article
+        fields = (
+            'pk',
+            'title',
+            'content',
+            'pub_date',
+            'updated_at',
+            'author',
+            'category',
+            'tags',
+        )
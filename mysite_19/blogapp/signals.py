@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from shopapp.caching import ARTICLES, bump_generation
+
+from .models import Article
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_articles_on_change(sender, **kwargs):
+    bump_generation(ARTICLES)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def touch_articles_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Смена тегов - тоже изменение статьи: обновляем updated_at для выборки изменений."""
+    if action == 'pre_clear' and reverse:
+        instance._article_ids = list(instance.article_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        article_ids = [instance.pk]
+    elif action == 'post_clear':
+        article_ids = getattr(instance, '_article_ids', None)
+    else:
+        article_ids = pk_set
+    if article_ids:
+        Article.objects.filter(pk__in=article_ids).update(updated_at=timezone.now())
+        bump_generation(ARTICLES)
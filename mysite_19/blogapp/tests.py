@@ -1,3 +1,59 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Article, Tag
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ArticlesConditionalGetTestCase(TestCase):
+    def setUp(self) -> None:
+        self.article = Article.objects.create(title='First article', content='Text')
+
+    def test_articles_list(self):
+        url = reverse('blogapp:articles_list')
+        response = self.client.get(url)
+        self.assertContains(response, 'First article')
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(not_modified.status_code, 304)
+
+        self.article.title = 'Renamed article'
+        self.article.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(changed, 'Renamed article')
+
+    def test_sitemap(self):
+        response = self.client.get('/sitemap.xml')
+        self.assertContains(response, self.article.get_absolute_url())
+        not_modified = self.client.get('/sitemap.xml', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEquals(not_modified.status_code, 304)
+
+
+class ArticleAPITestCase(TestCase):
+    def test_modified_since(self):
+        old = Article.objects.create(title='Old')
+        new = Article.objects.create(title='New')
+        since = timezone.now() - timedelta(hours=1)
+        Article.objects.filter(pk=old.pk).update(updated_at=since - timedelta(days=1))
+
+        data = self.client.get(reverse('blogapp:article-list'), {'modified_since': since.isoformat()}).json()
+        self.assertEquals([article['pk'] for article in data['results']], [new.pk])
+
+        tag = Tag.objects.create(name='news')
+        old.tags.add(tag)
+        data = self.client.get(reverse('blogapp:article-list'), {'modified_since': since.isoformat()}).json()
+        self.assertEquals([article['pk'] for article in data['results']], [new.pk, old.pk])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_articles_list_pages(self):
+        articles = [Article.objects.create(title=f'Article {i}', content='Text') for i in range(5)]
+        response = self.client.get(reverse('blogapp:articles_list'), {'page_size': 3})
+        self.assertEquals(list(response.context['object_list']), articles[:3])
+        self.assertIn('content', response.context['object_list'][0].get_deferred_fields())
+
+        response = self.client.get(response.context['next_page_url'])
+        self.assertEquals(list(response.context['object_list']), articles[3:])
+        self.assertIsNone(response.context['next_page_url'])
@@ -6,12 +6,17 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     ArticlesListView,
     ArticlesDetailView,
+    ArticleViewSet,
     LatestArticlesFeed,
 )
 
 app_name = "blogapp"
 
+routers = DefaultRouter()
+routers.register('articles', ArticleViewSet)
+
 urlpatterns = [
+    path('api/', include(routers.urls)),
     path('articles/', ArticlesListView.as_view(), name='articles_list'),
     path('article/<int:pk>/', ArticlesDetailView.as_view(), name='article_detail'),
     path('articles/latest/feed/', LatestArticlesFeed(), name='articles_feed'),
@@ -1,25 +1,76 @@
 from django.contrib.syndication.views import Feed
 from django.views.generic import ListView, DetailView
 from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from rest_framework.filters import OrderingFilter
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from shopapp.caching import ARTICLES
+from shopapp.changes import ModifiedSinceFilter
+from shopapp.conditional import conditional_get
+from shopapp.pagination import KeysetListMixin, KeysetPaginationMixin
+from shopapp.search import full_text_search
 
 from .models import Article
+from .serializers import ArticleSerializer
+
 
+@method_decorator(conditional_get(ARTICLES), name='get')
+class ArticlesListView(KeysetListMixin, ListView):
+    """
+    Получение списка статей, с ?q= - поиск по ним, самые релевантные первыми.
 
-class ArticlesListView(ListView):
-    """Получение списка статей."""
+    Постранично (keyset) и без текста статей. Повторный запрос
+    с If-None-Match получает 304, пока статьи не менялись.
+    """
 
-    template_name = 'blogapp/article-list.html'
+    template_name = 'blogapp/article_list.html'
     queryset = (
         Article.objects
         .filter(pub_date__isnull=False)
+        .defer('content')
         .order_by('pk')
     )
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        query = self.request.GET.get('q', '')
+        if query:
+            queryset = full_text_search(queryset, query, fields=['title', 'content'])
+        return queryset
+
 
 class ArticlesDetailView(DetailView):
     model = Article
 
 
+@method_decorator(conditional_get(ARTICLES), name='list')
+@method_decorator(conditional_get(ARTICLES), name='retrieve')
+class ArticleViewSet(KeysetPaginationMixin, ReadOnlyModelViewSet):
+    """
+    Опубликованные статьи для API.
+
+    С ?modified_since= отдаются только изменённые статьи (см. :mod:`shopapp.changes`).
+    """
+
+    queryset = (
+        Article.objects
+        .filter(pub_date__isnull=False)
+        .prefetch_related('tags')
+        .order_by('pk')
+    )
+    serializer_class = ArticleSerializer
+    filter_backends = [
+        OrderingFilter,
+        ModifiedSinceFilter,
+    ]
+    ordering_fields = [
+        'pub_date',
+        'updated_at',
+    ]
+    keyset_query_params = ('modified_since',)
+
+
 class LatestArticlesFeed(Feed):
     title = 'Blog Articles (latest)'
     description = 'Updates on changes and addition blog articles'
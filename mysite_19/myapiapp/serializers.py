@@ -1,8 +1,11 @@
 from django.contrib.auth.models import Group
 from rest_framework import serializers
 
+from shopapp.fast_serializers import FastListSerializer
+
 
 class GroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = Group
+        list_serializer_class = FastListSerializer
         fields = 'pk', 'name',
@@ -1,3 +1,16 @@
+from django.contrib.auth.models import Group
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
 
-# Create your tests here.
+from .serializers import GroupSerializer
+
+
+class GroupsListViewTestCase(TestCase):
+    def test_fast_list_is_byte_identical(self):
+        Group.objects.bulk_create([Group(name=f'Group {i} «ü»') for i in range(15)])
+
+        response = self.client.get(reverse('myapiapp:groups'))
+        self.assertEquals(response.data['count'], 15)
+        expected = GroupSerializer(list(Group.objects.order_by('pk')[:10]), many=True).data
+        self.assertEquals(response.content, JSONRenderer().render({**response.data, 'results': expected}))
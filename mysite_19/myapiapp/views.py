@@ -1,18 +1,18 @@
 from django.contrib.auth.models import Group
+from django.http import HttpRequest, JsonResponse
 
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from rest_framework.request import Request
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView, ListCreateAPIView
 from rest_framework.mixins import ListModelMixin
 
+from shopapp.fast_serializers import FastListModelMixin
+
 from .serializers import GroupSerializer
 
 
-@api_view()
-def hello_world_view(request: Request) -> Response:
-    return Response({'message': 'Hello World !'})
+async def hello_world_view(request: HttpRequest) -> JsonResponse:
+    # DRF 3.14 не поддерживает async-представления, поэтому это обычное представление Django
+    return JsonResponse({'message': 'Hello World !'})
 
 
 # class GroupsListView(ListModelMixin, GenericAPIView):
@@ -23,6 +23,6 @@ def hello_world_view(request: Request) -> Response:
 #         return self.list(request)
 
 
-class GroupsListView(ListCreateAPIView):
+class GroupsListView(FastListModelMixin, ListCreateAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+import myauth.models
+import mysite_19.storage
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("myauth", "0003_alter_profile_avatar"),
+    ]
+
+    # storage и upload_to в базе не хранятся: таблицу пересоздавать незачем
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="profile",
+                    name="avatar",
+                    field=models.ImageField(
+                        blank=True,
+                        null=True,
+                        storage=mysite_19.storage.content_addressed_storage,
+                        upload_to=myauth.models.user_avatar_directory_path,
+                    ),
+                ),
+            ],
+        ),
+    ]
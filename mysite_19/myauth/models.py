@@ -1,16 +1,21 @@
 from django.contrib.auth.models import User
 from django.db import models
 
+from mysite_19.storage import content_addressed_storage
+
 
 def user_avatar_directory_path(instance: 'User', filename: str) -> str:
-    return 'users/user_{pk}/avatar/{filename}'.format(
-        pk=instance.user.pk,
-        filename=filename,
-    )
+    # имя файла заменяется на SHA-256 содержимого, см. mysite_19.storage
+    return 'users/avatars/{filename}'.format(filename=filename)
 
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     agreement_acceptable = models.BooleanField(default=True)
-    avatar = models.ImageField(null=True, blank=True, upload_to=user_avatar_directory_path)
+    avatar = models.ImageField(
+        null=True,
+        blank=True,
+        upload_to=user_avatar_directory_path,
+        storage=content_addressed_storage,
+    )
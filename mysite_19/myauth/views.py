@@ -17,6 +17,9 @@ from django.views.generic import TemplateView, CreateView, UpdateView, ListView,
 from django.utils.translation import gettext_lazy as _, ngettext
 from django.views.decorators.cache import cache_page
 
+from mysite_19.upload_handlers import UploadErrorsMixin
+from shopapp.pagination import KeysetListMixin
+
 from .forms import UserProfileForm
 from .models import Profile
 
@@ -44,7 +47,7 @@ class HelloView(View):
 #         return HttpResponse(f'<h1>{welcome_message}</h1>')
 
 
-class EditProfilePageView(UpdateView):
+class EditProfilePageView(UploadErrorsMixin, UpdateView):
     model = Profile
     fields = ['avatar']
     context_object_name = 'profile'
@@ -68,16 +71,17 @@ class EditProfilePageView(UpdateView):
     #     )
 
 
-class AboutMeView(CreateView):
+class AboutMeView(UploadErrorsMixin, CreateView):
     model = Profile
     fields = 'user', 'bio', 'avatar',
     template_name = 'myauth/about-me.html'
 
 
-class UsersListView(ListView):
+class UsersListView(KeysetListMixin, ListView):
     template_name = 'myauth/users-list.html'
     context_object_name = 'users'
-    queryset = User.objects.all()
+    # на странице нужны только имена пользователей
+    queryset = User.objects.only('pk', 'username')
 
 
 class UsersDetailsView(UserPassesTestMixin, DetailView):
@@ -169,5 +173,5 @@ def get_session_view(request: HttpRequest) -> HttpResponse:
 
 
 class FooBarView(View):
-    def get(self, request: HttpRequest) -> JsonResponse:
+    async def get(self, request: HttpRequest) -> JsonResponse:
         return JsonResponse({'foo': 'bar', "spam": 'eggs'})
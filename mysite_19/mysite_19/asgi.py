@@ -5,6 +5,19 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Run with uvicorn workers under gunicorn (see docker-compose.yaml)::
+
+    gunicorn mysite_19.asgi:application --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
+
+or with uvicorn alone during development::
+
+    uvicorn mysite_19.asgi:application --port 8000
+
+Async views (products export, user orders export, foo-bar, api hello) then
+run in the worker's event loop and one worker serves many concurrent
+requests; sync views still work, each in a thread of its own.
+Compare both modes with ``manage.py bench_async``.
 """
 
 import os
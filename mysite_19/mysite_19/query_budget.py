@@ -0,0 +1,143 @@
+"""
+Бюджет SQL-запросов на один запрос к представлению.
+
+QueryRecorder записывает все запросы ко всем базам (через
+connection.execute_wrapper) и находит повторяющиеся шаблоны SQL -
+признак N+1: один и тот же запрос с разными параметрами на каждую
+строку списка.
+
+QueryBudgetMiddleware считает запросы каждого HTTP-запроса, включая
+запросы других middleware (сессия, пользователь). Бюджет задаётся
+атрибутом query_budget класса представления, а без него - настройкой
+QUERY_BUDGET (None - не проверять). При превышении бюджета в лог пишется
+предупреждение со списком повторов, а с QUERY_BUDGET_STRICT = True
+выбрасывается QueryBudgetExceeded. Шаблоны, повторившиеся не меньше
+QUERY_BUDGET_DUPLICATES раз, попадают в лог и без превышения бюджета.
+Если и QUERY_BUDGET, и QUERY_BUDGET_DUPLICATES равны None, middleware
+отключается и запросы не перехватываются вовсе.
+Запросы, выполненные при отдаче потокового ответа, не учитываются.
+
+В тестах то же самое проверяет QueryBudgetTestMixin.assertQueryBudget().
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+log = logging.getLogger(__name__)
+
+# Списки параметров IN (...) разной длины считаются одним шаблоном
+IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?|\d+|\'[^\']*\')(?:, (?:%s|\?|\d+|\'[^\']*\'))*\)', re.IGNORECASE)
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def sql_pattern(sql: str) -> str:
+    """SQL без значений параметров и литералов."""
+    return LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+
+
+class QueryRecorder:
+    """Запись SQL-запросов ко всем базам внутри блока with."""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all(initialized_only=False):
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def duplicates(self, min_count: int = 2) -> list:
+        """[(шаблон, сколько раз)] для шаблонов, повторившихся не меньше min_count раз, частые первыми."""
+        counts = Counter(map(sql_pattern, self.queries))
+        return [(pattern, count) for pattern, count in counts.most_common() if count >= min_count]
+
+    def report(self, limit: int = 5) -> str:
+        lines = [f'{self.count} queries']
+        for pattern, count in self.duplicates()[:limit]:
+            lines.append(f'  {count} x {pattern}')
+        return '\n'.join(lines)
+
+
+def get_view_budget(view_func):
+    """Бюджет представления: атрибут query_budget класса или функции, иначе QUERY_BUDGET."""
+    view = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None) or view_func
+    return getattr(view, 'query_budget', getattr(settings, 'QUERY_BUDGET', None))
+
+
+class QueryBudgetMiddleware:
+    """
+    Проверка числа SQL-запросов каждого HTTP-запроса.
+
+    Ставится в MIDDLEWARE как можно выше, чтобы учитывать запросы
+    остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        if getattr(settings, 'QUERY_BUDGET', None) is None and not getattr(settings, 'QUERY_BUDGET_DUPLICATES', None):
+            raise MiddlewareNotUsed('QUERY_BUDGET and QUERY_BUDGET_DUPLICATES are not set')
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = getattr(settings, 'QUERY_BUDGET', None)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_view_budget(view_func)
+
+    @staticmethod
+    def check(request, recorder: QueryRecorder) -> None:
+        budget = request.query_budget
+        if budget is not None and recorder.count > budget:
+            message = f'{request.method} {request.path}: query budget {budget} exceeded, {recorder.report()}'
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            log.warning(message)
+            return
+
+        min_count = getattr(settings, 'QUERY_BUDGET_DUPLICATES', None)
+        if min_count and recorder.duplicates(min_count):
+            log.warning('%s %s: repeated queries, %s', request.method, request.path, recorder.report())
+
+
+class QueryBudgetTestMixin:
+    """Для TestCase: assertQueryBudget() с отчётом о повторяющихся запросах."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int, duplicates: int = None):
+        """
+        Не больше budget запросов внутри блока with.
+
+        С duplicates - ещё и ни один шаблон SQL не повторяется duplicates раз и больше.
+        """
+        with QueryRecorder() as recorder:
+            yield recorder
+        if recorder.count > budget:
+            self.fail(f'Query budget {budget} exceeded: {recorder.report()}')
+        if duplicates and recorder.duplicates(duplicates):
+            self.fail(f'Repeated queries: {recorder.report()}')
@@ -21,8 +21,12 @@ from django.utils.translation import gettext_lazy as _
 
 import sentry_sdk
 
+# SENTRY_DSN= (пустое значение) отключает Sentry, например для нагрузочных тестов
 sentry_sdk.init(
-    dsn="https://eb8a50e2e9f3f0b2a3ece2cf64305f4a@o4504462136377344.ingest.sentry.io/4505957668880384",
+    dsn=getenv(
+        "SENTRY_DSN",
+        "https://eb8a50e2e9f3f0b2a3ece2cf64305f4a@o4504462136377344.ingest.sentry.io/4505957668880384",
+    ),
     traces_sample_rate=1.0,
     profiles_sample_rate=1.0,
 )
@@ -99,6 +103,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # 'django.middleware.cache.UpdateCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'mysite_19.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -143,17 +148,58 @@ DATABASES = {
     }
 }
 
-CACHES = {
-    'default': {
+# Бэкенд кэша выбирается переменной окружения DJANGO_CACHE_BACKEND:
+# 'file' - файловый кэш (по умолчанию), 'sqlite' - общий для всех воркеров
+# на хосте кэш в SQLite (WAL, LRU-вытеснение), 'locmem' - память процесса.
+CACHE_BACKENDS = {
+    'file': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': '/tmp/django_cache',
+    },
+    'sqlite': {
+        'BACKEND': 'mysite_19.sqlite_cache.SQLiteCache',
+        'LOCATION': getenv('DJANGO_CACHE_LOCATION', DATABASE_DIR / 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
 
-    }
+CACHES = {
+    'default': CACHE_BACKENDS[getenv('DJANGO_CACHE_BACKEND', 'file')],
 }
 
 # По умолчанию 10 минут
 CACHE_MIDDLEWARE_SECONDS = 200
 
+# Фоновые задачи импорта/экспорта CSV (shopapp.jobs)
+SHOP_JOBS_WORKERS = int(getenv('SHOP_JOBS_WORKERS', '2'))
+SHOP_JOBS_EAGER = getenv('SHOP_JOBS_EAGER', '0') == '1'
+
+
+def getenv_limit(name: str, default):
+    """Целое из переменной окружения name; пустое значение или none - None (без предела)."""
+    value = getenv(name, default)
+    if value is None or str(value).strip().lower() in ('', 'none'):
+        return None
+    return int(value)
+
+
+# Бюджет SQL-запросов на HTTP-запрос (mysite_19.query_budget); у представления может быть свой query_budget.
+# QUERY_BUDGET=none и QUERY_BUDGET_DUPLICATES=none отключают проверку совсем
+QUERY_BUDGET = getenv_limit('QUERY_BUDGET', '50')
+QUERY_BUDGET_STRICT = getenv('QUERY_BUDGET_STRICT', '0') == '1'
+QUERY_BUDGET_DUPLICATES = getenv_limit('QUERY_BUDGET_DUPLICATES', '10')
+
+# Уменьшенные копии изображений (shopapp.thumbnails)
+THUMBNAIL_WIDTHS = (150, 300, 600)
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_QUALITY = 80
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -202,7 +248,32 @@ STATIC_ROOT = BASE_DIR / 'static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'uploads'
-# DEFAULT_FILE_STORAGE =
+# Файлы фоновых задач (исходные и выгруженные CSV): не раздаются как /media/
+PRIVATE_MEDIA_ROOT = BASE_DIR / 'private'
+
+# Загрузки с пределом размера и SHA-256 (mysite_19.upload_handlers)
+FILE_UPLOAD_HANDLERS = [
+    'mysite_19.upload_handlers.HashingMemoryFileUploadHandler',
+    'mysite_19.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+# Предел размера одного файла в байтах, если у представления нет upload_max_size
+FILE_UPLOAD_MAX_SIZE = int(getenv('FILE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # Загрузки товаров, заказов и аватары: имена по SHA-256 содержимого (mysite_19.storage)
+    'content_addressed': {
+        'BACKEND': 'mysite_19.storage.ContentAddressedStorage',
+    },
+    'private': {
+        'BACKEND': 'mysite_19.storage.PrivateStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -0,0 +1,214 @@
+"""
+Кэш-бэкенд Django поверх SQLite в режиме WAL.
+
+Один файл базы разделяют все воркеры gunicorn на хосте (и контейнеры,
+если файл лежит на общем томе). В отличие от FileBasedCache, get - это
+один запрос по первичному ключу без открытия отдельного файла, а
+вытеснение не сканирует каталог: записи удаляются по давности последнего
+чтения (LRU) при превышении MAX_ENTRIES или MAX_SIZE (байт).
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'mysite_19.sqlite_cache.SQLiteCache',
+            'LOCATION': '/app/database/cache.sqlite3',
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+                'MAX_SIZE': 256 * 1024 * 1024,
+            },
+        },
+    }
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Как часто (в секундах) обновлять время последнего чтения записи.
+# Без этого каждый get превращался бы в запись в базу.
+ACCESS_RESOLUTION = 1.0
+
+# Раз в сколько записей проверять лимиты и вытеснять старые записи
+CULL_EVERY = 50
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._max_size = int(options.get('MAX_SIZE', 0)) or None
+        self._timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' key TEXT PRIMARY KEY,'
+                ' value BLOB NOT NULL,'
+                ' expires REAL,'
+                ' accessed REAL NOT NULL,'
+                ' size INTEGER NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+            db.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.db = db
+        return db
+
+    def _dumps(self, value) -> bytes:
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _write(self, key, value, timeout, mode='REPLACE') -> bool:
+        data = self._dumps(value)
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        if mode == 'ADD':
+            cursor = self._db.execute(
+                'INSERT INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET '
+                ' value = excluded.value, expires = excluded.expires,'
+                ' accessed = excluded.accessed, size = excluded.size '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (key, data, expires, now, len(data), now),
+            )
+        else:
+            cursor = self._db.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+                (key, data, expires, now, len(data)),
+            )
+        self._maybe_cull()
+        return cursor.rowcount > 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(key, value, timeout, mode='ADD')
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            self._db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if now - accessed > ACCESS_RESOLUTION:
+            self._db.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+
+        now = time.time()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*key_map, now),
+        ).fetchall()
+        if rows:
+            self._db.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({", ".join("?" * len(rows))})',
+                (now, *(key for key, _ in rows)),
+            )
+        return {key_map[key]: pickle.loads(value) for key, value in rows}
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарный инкремент: чтение и запись в одной IMMEDIATE-транзакции."""
+        key = self.make_and_validate_key(key, version=version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = self._dumps(value)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? WHERE key = ?',
+                (data, len(data), time.time(), key),
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        self._writes += 1
+        if self._writes % CULL_EVERY == 1:
+            self.cull()
+
+    def cull(self):
+        """Удаление просроченных записей и вытеснение давно не читавшихся (LRU)."""
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        count, size = db.execute('SELECT COUNT(*), TOTAL(size) FROM cache').fetchone()
+
+        to_delete = 0
+        if count > self._max_entries:
+            to_delete = count - self._max_entries + self._max_entries // self._cull_frequency
+        if self._max_size and size > self._max_size:
+            average = size / count
+            over = int((size - self._max_size * (1 - 1 / self._cull_frequency)) / average) + 1
+            to_delete = max(to_delete, over)
+
+        if to_delete:
+            db.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (to_delete,),
+            )
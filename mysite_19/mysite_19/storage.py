@@ -0,0 +1,101 @@
+"""
+Хранилище файлов с адресацией по содержимому.
+
+Файл сохраняется под SHA-256 своего содержимого в каталоге из upload_to::
+
+    products/preview/photo.jpg -> products/preview/3f/3fa1...9c.jpg
+
+Одинаковые загрузки дают одно и то же имя, и второй раз файл не
+записывается. Загруженный файл (TemporaryUploadedFile) переносится на
+место без копирования, а хэш для него считается ещё при приёме.
+
+Файл с таким именем никогда не меняется, поэтому его URL можно отдавать
+с Cache-Control: immutable на год (см. nginx/nginx_from_image.conf).
+
+Загрузки хэшируются всегда, как бы клиент ни назвал файл. Под заданным
+именем сохраняет только save_derivative() - для производных файлов
+(уменьшенных копий из :mod:`shopapp.thumbnails`), названных по хэшу
+оригинала.
+
+Один файл могут разделять несколько записей, поэтому удалять его через
+FieldFile.delete() нельзя, пока на него ссылается кто-то ещё.
+"""
+
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.utils import validate_file_name
+
+
+def content_hash(content) -> str:
+    """SHA-256 содержимого файла content (File) в hex."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return digest.hexdigest()
+
+
+def hashed_name(name: str, digest: str) -> str:
+    """Имя файла name в хранилище по хэшу его содержимого digest."""
+    directory, filename = posixpath.split(name)
+    extension = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы по SHA-256 содержимого и не хранит дубликатов."""
+
+    def _save(self, name, content):
+        # обработчики загрузки (mysite_19.upload_handlers) уже посчитали хэш
+        digest = getattr(content, 'sha256', None) or content_hash(content)
+        name = hashed_name(name, digest)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+    def save_derivative(self, name, content) -> str:
+        """
+        Сохранение файла, полученного из хранимого (например, уменьшенной
+        копии), под именем name без хэширования.
+
+        name должно однозначно определяться содержимым оригинала, тогда
+        файл с ним тоже никогда не меняется. Если файл уже есть, он не
+        перезаписывается.
+        """
+        validate_file_name(name, allow_relative_path=True)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def content_addressed_storage():
+    """Хранилище из STORAGES['content_addressed'] - для параметра storage полей FileField."""
+    return storages['content_addressed']
+
+
+class PrivateStorage(FileSystemStorage):
+    """
+    Файлы вне MEDIA_ROOT (в PRIVATE_MEDIA_ROOT), которые nginx не раздаёт.
+
+    URL у них нет - отдавать их должно представление с проверкой прав.
+    """
+
+    @property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PRIVATE_MEDIA_ROOT)
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+
+def private_storage():
+    """Хранилище из STORAGES['private'] - для параметра storage полей FileField."""
+    return storages['private']
@@ -0,0 +1,116 @@
+"""
+Обработчики загрузки файлов с пределом размера и SHA-256.
+
+Замена стандартных MemoryFileUploadHandler и TemporaryFileUploadHandler
+(настройка FILE_UPLOAD_HANDLERS). Пока файл принимается, они:
+
+* считают SHA-256 содержимого - он доступен как uploaded_file.sha256,
+  и ContentAddressedStorage (mysite_19.storage) не читает файл ещё раз;
+* проверяют размер - файл больше предела отбрасывается сразу, как только
+  предел превышен (или заранее, если клиент прислал Content-Length
+  файла), и ни память, ни диск на остаток не тратятся.
+
+Предел - атрибут upload_max_size класса представления, действия ViewSet
+или функции (декоратор upload_max_size), а без него - настройка
+FILE_UPLOAD_MAX_SIZE (None - без предела). Отброшенного файла нет в
+request.FILES, а сообщение о нём - в rejected_uploads(request).
+Для форм - add_upload_errors() и UploadErrorsMixin.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, SkipFile, TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+
+def upload_max_size(max_size):
+    """Декоратор представления: предел размера загружаемого файла в байтах."""
+
+    def decorator(view_func):
+        view_func.upload_max_size = max_size
+        return view_func
+
+    return decorator
+
+
+def get_upload_max_size(request):
+    """Предел размера файла для представления, которое обрабатывает request."""
+    default = getattr(settings, 'FILE_UPLOAD_MAX_SIZE', None)
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return default
+
+    view_func = match.func
+    view = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None) or view_func
+    # действие ViewSet (например, upload_csv) может задать свой предел
+    action = getattr(view_func, 'actions', {}).get(request.method.lower())
+    handler = getattr(view, action, None) if action else None
+    return getattr(handler, 'upload_max_size', getattr(view, 'upload_max_size', default))
+
+
+def rejected_uploads(request) -> dict:
+    """{имя поля: сообщение} для файлов, отброшенных обработчиками загрузки."""
+    # тело запроса разбирается при первом обращении к FILES (или POST)
+    request.FILES
+    # у Request из DRF сами файлы и атрибуты - у исходного HttpRequest
+    request = getattr(request, '_request', request)
+    return getattr(request, '_rejected_uploads', {})
+
+
+def add_upload_errors(form, request) -> None:
+    """Ошибки отброшенных файлов в полях формы form (вместо "обязательное поле")."""
+    for field_name, message in rejected_uploads(request).items():
+        if field_name in form.fields:
+            form.errors.pop(field_name, None)
+            form.add_error(field_name, message)
+
+
+class UploadErrorsMixin:
+    """Для FormView (CreateView, UpdateView): отброшенный файл - ошибка формы."""
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        if form.is_bound:
+            add_upload_errors(form, self.request)
+        return form
+
+
+class HashingUploadMixin:
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.sha256 = hashlib.sha256()
+        self.max_size = get_upload_max_size(self.request)
+        self.declared_size = content_length
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        size = max(start + len(raw_data), self.declared_size or 0)
+        if self.max_size is not None and size > self.max_size:
+            self.reject(f'File is larger than {filesizeformat(self.max_size)}.')
+
+        data = super().receive_data_chunk(raw_data, start)
+        if data is None:
+            # обработчик забрал данные себе - только он и считает хэш
+            self.sha256.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.sha256.hexdigest()
+        return uploaded_file
+
+    def reject(self, message):
+        if not hasattr(self.request, '_rejected_uploads'):
+            self.request._rejected_uploads = {}
+        self.request._rejected_uploads[self.field_name] = message
+        # остаток файла парсер прочитает и выбросит, не передавая обработчикам
+        raise SkipFile(message)
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
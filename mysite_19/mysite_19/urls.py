@@ -21,6 +21,9 @@ from django.contrib import admin
 from django.contrib.sitemaps.views import sitemap
 from django.urls import path, include
 
+from shopapp.caching import ARTICLES
+from shopapp.conditional import conditional_get
+
 from .sitemaps import sitemaps
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
@@ -36,7 +39,7 @@ urlpatterns = [
     path('blog/', include('blogapp.urls')),
     path(
         'sitemap.xml',
-        sitemap,
+        conditional_get(ARTICLES)(sitemap),
         {'sitemaps': sitemaps},
         name='django.contrib.sitemaps.views.sitemap'
     ),
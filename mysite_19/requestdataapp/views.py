@@ -1,9 +1,18 @@
+import logging
+
 from django.core.files.storage import FileSystemStorage
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 
+from mysite_19.upload_handlers import rejected_uploads, upload_max_size
+
 from .forms import UserBioForm, UploadFileForm
 
+log = logging.getLogger(__name__)
+
+# Файл больше этого размера отбрасывается ещё при загрузке и на диск не пишется
+MAX_UPLOAD_SIZE = 1048576
+
 
 def process_get_view(request: HttpRequest) -> HttpResponse:
     a = request.GET.get('a', '')
@@ -24,21 +33,19 @@ def user_form(request: HttpRequest) -> HttpResponse:
     return render(request, 'requestdataapp/user-bio-form.html', context=context)
 
 
+@upload_max_size(MAX_UPLOAD_SIZE)
 def handle_file_upload(request: HttpRequest) -> HttpResponse:
     if request.method == 'POST':
+        if 'file' in rejected_uploads(request):
+            log.warning('Uploaded file is larger than %s bytes, skipped.', MAX_UPLOAD_SIZE)
+            return render(request, 'requestdataapp/error-message.html', status=413)
+
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
             # myfile = request.FILES['myfile']
             myfile = form.cleaned_data['file']
             fs = FileSystemStorage()
             filename = fs.save(myfile.name, myfile)
-            file_size = fs.size(filename)
-
-            if file_size > 1048576:
-                fs.delete(filename)
-                print(f'Size of file {filename} more then 1Mb, so file is deleted.')
-                return render(request, 'requestdataapp/error-message.html')
-
             print('Saved file', filename)
 
     else:
@@ -1,13 +1,19 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect
-from django.urls import path
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
 
-from .common import save_csv_products, save_csv_orders
-from .models import Product, Order, ProductImage
+from mysite_19.upload_handlers import add_upload_errors, upload_max_size
+
+from .caching import PRODUCTS, bump_generation
+from .common import CSV_UPLOAD_MAX_SIZE, ImportResult, save_csv_products, save_csv_orders
+from .jobs import start_import
+from .models import Product, Order, OrderItem, ProductImage, Job
 from .admin_mixins import ExportAsMixins
-from .forms import CSVImportForm
+from .forms import CSVImportForm, ProductCSVImportForm
 
 
 class OrderInline(admin.TabularInline):
@@ -22,14 +28,45 @@ class ProductInline(admin.StackedInline):
     model = ProductImage
 
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = 'product',
+
+
+def message_import_result(modeladmin: admin.ModelAdmin, request: HttpRequest, result: ImportResult):
+    if not result.error_count:
+        modeladmin.message_user(request, f'Data from csv was imported: {result}.')
+        return
+
+    first_errors = '; '.join(
+        f"line {error['line']}: {error['error']}"
+        for error in result.errors[:5]
+    )
+    modeladmin.message_user(
+        request,
+        f'Data from csv was imported with errors: {result}. {first_errors}',
+        level=messages.WARNING,
+    )
+
+
+def message_import_started(modeladmin: admin.ModelAdmin, request: HttpRequest, job: Job):
+    status_url = reverse('shopapp:job_status', kwargs={'pk': job.pk})
+    modeladmin.message_user(
+        request,
+        format_html('Import started in background, progress: <a href="{0}">{0}</a>', status_url),
+    )
+
+
 @admin.action(description='Archive products')
 def mark_archived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=True)
+    queryset.update(archived=True, updated_at=timezone.now())
+    bump_generation(PRODUCTS)
 
 
 @admin.action(description='Unarchive products')
 def mark_unarchived(modeladmin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=False)
+    queryset.update(archived=False, updated_at=timezone.now())
+    bump_generation(PRODUCTS)
 
 
 @admin.register(Product)
@@ -76,24 +113,38 @@ class ProductAdmin(admin.ModelAdmin, ExportAsMixins):
             return obj.description
         return obj.description[:50] + '...'
 
+    @upload_max_size(CSV_UPLOAD_MAX_SIZE)
     def import_csv(self, request: HttpRequest) -> HttpResponse:
         if request.method == 'GET':
-            form = CSVImportForm()
+            form = ProductCSVImportForm()
             context = {
                 'form': form,
             }
             return render(request, 'admin/csv_form.html', context)
 
-        form = CSVImportForm(request.POST, request.FILES)
+        form = ProductCSVImportForm(request.POST, request.FILES)
+        add_upload_errors(form, request)
         if not form.is_valid():
             context = {
                 'form': form,
             }
             return render(request, 'admin/csv_form.html', context, status=400)
 
-        save_csv_products(
+        if form.cleaned_data['run_in_background']:
+            job = start_import(
+                'import_products',
+                form.files['csv_file'],
+                encoding=request.encoding,
+                user=request.user,
+                upsert_key=form.cleaned_data['upsert_key'] or None,
+            )
+            message_import_started(self, request, job)
+            return redirect('..')
+
+        result = save_csv_products(
             form.files['csv_file'].file,
             encoding=request.encoding,
+            upsert_key=form.cleaned_data['upsert_key'] or None,
         )
 
         # reader = DictReader(csv_file)
@@ -103,7 +154,7 @@ class ProductAdmin(admin.ModelAdmin, ExportAsMixins):
         #     for row in reader
         # ]
         # Product.objects.bulk_create(products)
-        self.message_user(request, 'Data from csv was imported.')
+        message_import_result(self, request, result)
         return redirect('..')
 
     def get_urls(self):
@@ -127,16 +178,18 @@ class ProductAdmin(admin.ModelAdmin, ExportAsMixins):
 class OrderAdmin(admin.ModelAdmin, ExportAsMixins):
     change_list_template = 'shopapp/orders_change_list.html'
     inlines = [
+        OrderItemInline,
         ProductInline,
     ]
-    list_display = 'delivery_address', 'promocode', 'created_at', 'user_verbose',
+    list_display = 'delivery_address', 'promocode', 'created_at', 'user_verbose', 'items_count', 'total',
 
     def get_queryset(self, request):
-        return Order.objects.select_related('user').prefetch_related('products')
+        return Order.objects.select_related('user')
 
     def user_verbose(self, obj: Order) -> str:
         return obj.user.first_name or obj.user.username
 
+    @upload_max_size(CSV_UPLOAD_MAX_SIZE)
     def import_csv(self, request: HttpRequest) -> HttpResponse:
         if request.method == 'GET':
             form = CSVImportForm()
@@ -146,18 +199,29 @@ class OrderAdmin(admin.ModelAdmin, ExportAsMixins):
             return render(request, 'admin/csv_form.html', context)
 
         form = CSVImportForm(request.POST, request.FILES)
+        add_upload_errors(form, request)
         if not form.is_valid():
             context = {
                 'form': form,
             }
             return render(request, 'admin/csv_form.html', context, status=400)
 
-        save_csv_orders(
+        if form.cleaned_data['run_in_background']:
+            job = start_import(
+                'import_orders',
+                form.files['csv_file'],
+                encoding=request.encoding,
+                user=request.user,
+            )
+            message_import_started(self, request, job)
+            return redirect('..')
+
+        result = save_csv_orders(
             form.files['csv_file'].file,
             encoding=request.encoding,
         )
 
-        self.message_user(request, 'Data from csv was imported.')
+        message_import_result(self, request, result)
         return redirect('..')
 
     def get_urls(self):
@@ -170,3 +234,10 @@ class OrderAdmin(admin.ModelAdmin, ExportAsMixins):
             )
         ]
         return new_urls + urls
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = 'pk', 'kind', 'status', 'progress', 'total', 'created_at', 'finished_at',
+    list_filter = 'kind', 'status',
+    readonly_fields = [field.name for field in Job._meta.fields]
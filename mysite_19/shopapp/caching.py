@@ -0,0 +1,385 @@
+"""
+Кэширование данных магазина с инвалидацией по поколениям.
+
+Для каждой группы данных (например, каталога товаров) в кэше хранится
+счётчик поколения. Он входит в ключ каждой записи, а сигналы моделей
+увеличивают его при любом изменении. Старые записи после этого просто
+перестают читаться и вытесняются по таймауту, так что кэшировать можно
+надолго, не рискуя отдать устаревшие данные. Вместе с поколением
+хранится время его последнего увеличения - из них строятся ETag и
+Last-Modified ответов (см. :mod:`shopapp.conditional`).
+
+Для дорогих в построении ключей есть get_or_build() - защита от "стада"
+запросов при истечении ключа, и TwoTierCache - локальный LRU процесса
+перед общим кэшем. У обоих есть асинхронные версии для async-представлений
+(aget_or_build(), TwoTierCache.aget_or_set()), которые не блокируют
+цикл событий на ожидании кэша.
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+
+PRODUCTS = 'products'
+ORDERS = 'orders'
+ARTICLES = 'articles'
+PRODUCTS_CACHE_TIMEOUT = 60 * 60
+
+MISSING = object()
+
+# Все двухуровневые кэши процесса по имени, для мониторинга счётчиков
+TWO_TIER_CACHES = {}
+
+
+def generation_key(name: str) -> str:
+    return f'generation:{name}'
+
+
+def get_generation(name: str) -> int:
+    """
+    Текущее поколение группы данных.
+
+    Если счётчик вытеснен из кэша, он заводится заново от текущего времени
+    в наносекундах, поэтому никогда не совпадёт с одним из прежних значений.
+    """
+    key = generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def modified_key(name: str) -> str:
+    return f'modified:{name}'
+
+
+def get_modified(name: str) -> float:
+    """
+    Время (timestamp) последнего увеличения поколения группы данных.
+
+    Если отметка вытеснена из кэша, она заводится заново от текущего момента:
+    лучше один раз отдать данные целиком, чем ответить 304 на изменённые.
+    """
+    key = modified_key(name)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, time.time(), None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_generation(name: str) -> None:
+    """
+    Увеличение поколения группы данных.
+
+    Внутри транзакции поколение увеличивается ещё раз после фиксации:
+    иначе запрос, прочитавший старые данные до COMMIT, закэшировал бы
+    их под новым поколением.
+    """
+    _bump_generation(name)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_generation(name))
+
+
+def _bump_generation(name: str) -> None:
+    key = generation_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+    cache.set(modified_key(name), time.time(), None)
+
+
+def normalize_params(params: QueryDict, ignore=()) -> list:
+    """Параметры запроса без пустых значений, в стабильном порядке."""
+    return sorted(
+        (name, sorted(value for value in params.getlist(name) if value != ''))
+        for name in params
+        if name not in ignore and any(value != '' for value in params.getlist(name))
+    )
+
+
+def request_cache_key(name: str, request: HttpRequest, ignore=()) -> str:
+    """
+    Ключ кэша для ответа на запрос к данным группы name.
+
+    В ключ входят поколение группы, хост (он попадает в ссылки пагинации)
+    и нормализованные параметры, поэтому ?a=1&b= и ?b=&a=1 дают одну запись.
+    """
+    params = normalize_params(request.GET, ignore=ignore)
+    digest = md5(repr((request.get_host(), params)).encode()).hexdigest()
+    return f'{name}:{get_generation(name)}:{digest}'
+
+
+class Envelope:
+    """Значение в общем кэше вместе со временем его построения и истечения."""
+
+    __slots__ = ('value', 'delta', 'expires')
+
+    def __init__(self, value, delta: float, expires: float):
+        self.value = value
+        self.delta = delta
+        self.expires = expires
+
+    def __getstate__(self):
+        return self.value, self.delta, self.expires
+
+    def __setstate__(self, state):
+        self.value, self.delta, self.expires = state
+
+    def should_recompute(self, beta: float) -> bool:
+        """
+        Вероятностное раннее истечение (XFetch).
+
+        Чем ближе срок истечения и чем дольше строилось значение, тем выше
+        шанс, что очередной запрос перестроит его заранее - так записи
+        обновляются по одной, а не все разом в момент истечения.
+        """
+        return time.time() - self.delta * beta * math.log(1 - random.random()) >= self.expires
+
+
+def get_or_build(key, builder, timeout, beta: float = 1.0, lock_timeout: float = 10,
+                 backend=None, stats: Counter = None):
+    """
+    Значение ключа из кэша, а при промахе - построенное builder().
+
+    Одновременно значение строит только один процесс: он берёт блокировку
+    cache.add("<key>:lock"), остальные ждут, пока значение появится в кэше.
+    Незадолго до истечения (см. Envelope.should_recompute) значение
+    перестраивается заранее тем, кому удалось взять блокировку, а остальные
+    продолжают получать текущее значение без ожидания.
+    """
+    backend = backend or cache
+    stats = stats if stats is not None else Counter()
+    lock_key = f'{key}:lock'
+
+    envelope = backend.get(key)
+    if isinstance(envelope, Envelope):
+        stats['shared_hits'] += 1
+        if not envelope.should_recompute(beta) or not backend.add(lock_key, 1, lock_timeout):
+            return envelope.value
+        stats['early_builds'] += 1
+        return _build(key, builder, timeout, backend, lock_key, stats)
+
+    stats['shared_misses'] += 1
+    if not backend.add(lock_key, 1, lock_timeout):
+        # значение уже строит другой процесс, ждём его
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            envelope = backend.get(key)
+            if isinstance(envelope, Envelope):
+                stats['shared_hits'] += 1
+                return envelope.value
+        return _build(key, builder, timeout, backend, None, stats)
+
+    return _build(key, builder, timeout, backend, lock_key, stats)
+
+
+def _build(key, builder, timeout, backend, lock_key, stats: Counter):
+    try:
+        stats['builds'] += 1
+        started = time.time()
+        value = builder()
+        finished = time.time()
+        backend.set(key, Envelope(value, finished - started, finished + timeout), timeout)
+    finally:
+        if lock_key:
+            backend.delete(lock_key)
+    return value
+
+
+async def aget_or_build(key, builder, timeout, beta: float = 1.0, lock_timeout: float = 10,
+                        backend=None, stats: Counter = None):
+    """Асинхронная get_or_build(): builder - корутинная функция, кэш читается через aget/aadd."""
+    backend = backend or cache
+    stats = stats if stats is not None else Counter()
+    lock_key = f'{key}:lock'
+
+    envelope = await backend.aget(key)
+    if isinstance(envelope, Envelope):
+        stats['shared_hits'] += 1
+        if not envelope.should_recompute(beta) or not await backend.aadd(lock_key, 1, lock_timeout):
+            return envelope.value
+        stats['early_builds'] += 1
+        return await _abuild(key, builder, timeout, backend, lock_key, stats)
+
+    stats['shared_misses'] += 1
+    if not await backend.aadd(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            envelope = await backend.aget(key)
+            if isinstance(envelope, Envelope):
+                stats['shared_hits'] += 1
+                return envelope.value
+        return await _abuild(key, builder, timeout, backend, None, stats)
+
+    return await _abuild(key, builder, timeout, backend, lock_key, stats)
+
+
+async def _abuild(key, builder, timeout, backend, lock_key, stats: Counter):
+    try:
+        stats['builds'] += 1
+        started = time.time()
+        value = await builder()
+        finished = time.time()
+        await backend.aset(key, Envelope(value, finished - started, finished + timeout), timeout)
+    finally:
+        if lock_key:
+            await backend.adelete(lock_key)
+    return value
+
+
+class TwoTierCache:
+    """
+    Двухуровневый кэш для горячих ключей.
+
+    Первый уровень - ограниченный LRU-словарь в памяти процесса с коротким
+    TTL, второй - настроенный кэш Django, общий для всех воркеров. Значение
+    строится не более одного раза за раз: внутри процесса потоки ждут друг
+    друга на блокировке ключа, а между воркерами работает get_or_build()
+    с блокировкой в общем кэше и ранним перестроением.
+
+    Значения первого уровня общие для всех запросов процесса,
+    поэтому изменять полученные объекты нельзя.
+    """
+
+    def __init__(self, name: str, maxsize: int = 256, local_timeout: float = 5,
+                 lock_timeout: float = 10, beta: float = 1.0, backend=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.local_timeout = local_timeout
+        self.lock_timeout = lock_timeout
+        self.beta = beta
+        self.backend = backend or cache
+        self.stats = Counter()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        TWO_TIER_CACHES[name] = self
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _set_local(self, key, value) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_timeout, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def get(self, key, default=None):
+        value = self._get_local(key)
+        if value is not MISSING:
+            self.stats['local_hits'] += 1
+            return value
+        self.stats['local_misses'] += 1
+
+        envelope = self.backend.get(key)
+        if not isinstance(envelope, Envelope):
+            self.stats['shared_misses'] += 1
+            return default
+        self.stats['shared_hits'] += 1
+        self._set_local(key, envelope.value)
+        return envelope.value
+
+    def set(self, key, value, timeout) -> None:
+        self.backend.set(key, Envelope(value, 0, time.time() + timeout), timeout)
+        self._set_local(key, value)
+
+    def delete(self, key) -> None:
+        self.backend.delete(key)
+        with self._lock:
+            self._local.pop(key, None)
+
+    def get_or_set(self, key, builder, timeout):
+        """Значение ключа, а при промахе на обоих уровнях - результат builder()."""
+        value = self._get_local(key)
+        if value is not MISSING:
+            self.stats['local_hits'] += 1
+            return value
+
+        with self._key_locks[hash(key) % len(self._key_locks)]:
+            # пока ждали блокировку, значение мог положить другой поток
+            value = self._get_local(key)
+            if value is not MISSING:
+                self.stats['local_hits'] += 1
+                return value
+            self.stats['local_misses'] += 1
+
+            value = get_or_build(
+                key,
+                builder,
+                timeout,
+                beta=self.beta,
+                lock_timeout=self.lock_timeout,
+                backend=self.backend,
+                stats=self.stats,
+            )
+            self._set_local(key, value)
+            return value
+
+    async def aget_or_set(self, key, builder, timeout):
+        """
+        Асинхронная get_or_set(): builder - корутинная функция.
+
+        Первый уровень читается без ожидания. Потоковых блокировок ключа
+        здесь нет (они остановили бы весь цикл событий), одновременные
+        промахи разводит блокировка в общем кэше из aget_or_build().
+        """
+        value = self._get_local(key)
+        if value is not MISSING:
+            self.stats['local_hits'] += 1
+            return value
+        self.stats['local_misses'] += 1
+
+        value = await aget_or_build(
+            key,
+            builder,
+            timeout,
+            beta=self.beta,
+            lock_timeout=self.lock_timeout,
+            backend=self.backend,
+            stats=self.stats,
+        )
+        self._set_local(key, value)
+        return value
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            size = len(self._local)
+        return {
+            'local_hits': self.stats['local_hits'],
+            'local_misses': self.stats['local_misses'],
+            'shared_hits': self.stats['shared_hits'],
+            'shared_misses': self.stats['shared_misses'],
+            'builds': self.stats['builds'],
+            'early_builds': self.stats['early_builds'],
+            'local_size': size,
+        }
+
+
+exports_cache = TwoTierCache('exports')
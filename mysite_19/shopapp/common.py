@@ -1,36 +1,378 @@
-from csv import DictReader
+import logging
+from csv import DictReader, writer as csv_writer
 from io import TextIOWrapper
+from timeit import default_timer
 
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, transaction
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+
+from .caching import PRODUCTS, bump_generation
 from .models import Product, Order
 
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Поля Product, по которым разрешено сопоставлять строки при upsert-импорте
+UPSERT_KEYS = ('name',)
+
+# Предел размера загружаемого CSV-файла (байт), см. mysite_19.upload_handlers
+CSV_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+
+
+class ImportResult:
+    """Итог импорта: сколько строк прочитано, создано и какие строки отклонены."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.elapsed:
+            return float(self.rows)
+        return self.rows / self.elapsed
+
+    def add_error(self, line: int, message) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f'{self.rows} rows read, {self.created} created, {self.updated} updated, '
+            f'{self.unchanged} unchanged, {self.error_count} rejected '
+            f'({self.rows_per_second:.0f} rows/sec)'
+        )
+
+
+class CSVImporter:
+    """
+    Потоковый импорт CSV в модель.
+
+    Файл читается построчно, каждое значение приводится к типу поля модели
+    и проходит его валидаторы. Корректные строки копятся пачками по
+    batch_size и вставляются через bulk_create, каждая пачка в своём
+    atomic-блоке (savepoint, если импорт идёт внутри транзакции).
+    Если пачка не вставилась, она досохраняется по одной строке,
+    чтобы отклонить только виноватые строки.
+
+    С upsert_key строки сопоставляются с уже существующими записями
+    по этому полю: новые создаются, изменившиеся обновляются через
+    bulk_update, а совпадающие с базой пропускаются без записи.
+
+    progress, если задан, вызывается с текущим ImportResult после каждой пачки.
+    Нередактируемые поля (даты auto_now_add/auto_now, денормализованные итоги)
+    из CSV не принимаются, а auto_now-поля обновлённых записей выставляются
+    в момент импорта.
+    """
+
+    def __init__(self, model: type[Model], batch_size: int = DEFAULT_BATCH_SIZE, upsert_key: str = None,
+                 progress=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.upsert_key = upsert_key
+        self.progress = progress
+        self.columns = {}
+        self.auto_now = [field.attname for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.auto_created or not field.editable:
+                continue
+            self.columns[field.name] = field
+            self.columns[field.attname] = field
+
+    def run(self, file, encoding) -> ImportResult:
+        result = ImportResult()
+        started = default_timer()
+
+        reader = DictReader(TextIOWrapper(file, encoding=encoding))
+        unknown = set(reader.fieldnames or ()) - set(self.columns)
+        if unknown:
+            result.add_error(1, f'Unknown columns: {", ".join(sorted(unknown))}')
+            return result
+        if self.upsert_key and self.upsert_key not in reader.fieldnames:
+            result.add_error(1, f'Upsert key column {self.upsert_key!r} is missing.')
+            return result
+
+        batch = []
+        for row in reader:
+            result.rows += 1
+            line = reader.line_num
+            try:
+                batch.append((line, self.clean_row(row)))
+            except ValidationError as exc:
+                result.add_error(line, exc.message_dict)
+                continue
+
+            if len(batch) >= self.batch_size:
+                self.flush(batch, result)
+                batch = []
+
+        if batch:
+            self.flush(batch, result)
+
+        result.elapsed = default_timer() - started
+        log.info('Imported %s: %s', self.model._meta.model_name, result)
+        return result
+
+    def clean_row(self, row: dict) -> dict:
+        values = {}
+        errors = {}
+        for column, raw in row.items():
+            if column is None:
+                errors['__all__'] = ['Row has more values than the header.']
+                continue
+            field = self.columns[column]
+            try:
+                value = self.clean_value(field, raw)
+            except ValidationError as exc:
+                errors[column] = exc.messages
+                continue
+            if value is not None or field.null:
+                values[field.attname] = value
+            elif not field.has_default():
+                errors[column] = [str(field.error_messages['null'])]
+
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def clean_value(self, field, raw):
+        raw = (raw or '').strip()
+        if field.is_relation:
+            if not raw:
+                return None
+            return field.target_field.to_python(raw)
+        if not raw and not field.empty_strings_allowed:
+            return None
+        return field.clean(raw, None)
+
+    def flush(self, batch, result: ImportResult) -> None:
+        batch = self.check_relations(batch, result)
+        if self.upsert_key:
+            batch = self.update_existing(batch, result)
+        if batch:
+            self.save_batch(batch, result)
+        if self.progress:
+            self.progress(result)
+
+    def update_existing(self, batch, result: ImportResult):
+        """
+        Обновление уже существующих записей пачки.
+
+        Существующие записи читаются одним IN-запросом по ключу, и
+        bulk_update получает только те, у которых что-то поменялось.
+        Возвращаются строки, для которых записи ещё нет.
+        """
+        key = self.columns[self.upsert_key].attname
+        fields = sorted({attname for _, values in batch for attname in values} - {key})
+
+        new_rows = {}
+        for line, values in batch:
+            if values[key] in new_rows:
+                # строка перекрыта более поздней строкой с тем же ключом
+                result.unchanged += 1
+            new_rows[values[key]] = (line, values)
+
+        existing = {}
+        for current in (
+            self.model._default_manager
+            .filter(**{f'{key}__in': list(new_rows)})
+            .values('pk', key, *fields)
+            .iterator()
+        ):
+            existing.setdefault(current[key], []).append(current)
+
+        changed = []
+        now = timezone.now()
+        for value, rows in existing.items():
+            _, values = new_rows.pop(value)
+            for current in rows:
+                if all(current[attname] == new_value for attname, new_value in values.items()):
+                    result.unchanged += 1
+                    continue
+                current.update(values)
+                current.update(dict.fromkeys(self.auto_now, now))
+                changed.append(self.model(**current))
+
+        if changed:
+            with transaction.atomic():
+                self.model._default_manager.bulk_update(changed, fields + self.auto_now)
+            result.updated += len(changed)
+
+        return list(new_rows.values())
+
+    def save_batch(self, batch, result: ImportResult) -> None:
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(
+                    [self.model(**values) for _, values in batch]
+                )
+            result.created += len(batch)
+            return
+        except DatabaseError:
+            log.warning('Batch insert into %s failed, retrying row by row', self.model._meta.model_name)
+
+        for line, values in batch:
+            try:
+                with transaction.atomic():
+                    self.model.objects.create(**values)
+                result.created += 1
+            except DatabaseError as exc:
+                result.add_error(line, str(exc))
+
+    def check_relations(self, batch, result: ImportResult):
+        """Проверка внешних ключей пачки одним IN-запросом на каждое поле."""
+        for field in self.model._meta.concrete_fields:
+            if not field.many_to_one:
+                continue
+            referenced = {values[field.attname] for _, values in batch if values.get(field.attname) is not None}
+            if not referenced:
+                continue
+            existing = set(
+                field.related_model._default_manager
+                .filter(**{f'{field.target_field.attname}__in': referenced})
+                .values_list(field.target_field.attname, flat=True)
+            )
+            checked = []
+            for line, values in batch:
+                value = values.get(field.attname)
+                if value is not None and value not in existing:
+                    result.add_error(line, {field.name: [f'{field.related_model.__name__} {value} does not exist.']})
+                    continue
+                checked.append((line, values))
+            batch = checked
+        return batch
+
+
+def save_csv_products(file, encoding, batch_size=DEFAULT_BATCH_SIZE, upsert_key=None, progress=None) -> ImportResult:
+    importer = CSVImporter(Product, batch_size=batch_size, upsert_key=upsert_key, progress=progress)
+    result = importer.run(file, encoding)
+    if result.created or result.updated:
+        # bulk_create/bulk_update не шлют сигналов, сбрасываем кэш каталога сами
+        bump_generation(PRODUCTS)
+    return result
+
+
+def save_csv_orders(file, encoding, batch_size=DEFAULT_BATCH_SIZE, progress=None) -> ImportResult:
+    return CSVImporter(Order, batch_size=batch_size, progress=progress).run(file, encoding)
+
+
+class Echo:
+    """Псевдо-буфер: write() сразу возвращает строку, ничего не накапливая."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_rows(queryset: QuerySet, fields, chunk_size=2000):
+    """
+    Построчная выгрузка queryset в CSV.
+
+    Строки читаются через values_list().iterator() пачками по chunk_size
+    (на PostgreSQL это серверный курсор), и каждая пачка отдаётся
+    одним куском, поэтому память не растёт вместе с числом строк.
+    """
+    writer = csv_writer(Echo())
+    yield writer.writerow(fields)
+
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+class JSONRowsEncoder:
+    """
+    Кодирование строк values() в JSON-массив или NDJSON по кускам.
+
+    Массив можно обернуть в объект с ключом key: {"products": [...]}.
+    Decimal и даты кодируются как в JsonResponse (DjangoJSONEncoder).
+    """
+
+    def __init__(self, ndjson: bool = False, key: str = None):
+        self.ndjson = ndjson
+        self.key = key
+        self.encode = DjangoJSONEncoder().encode
+        self.first = True
+
+    def start(self) -> str:
+        if self.ndjson:
+            return ''
+        return f'{{{self.encode(self.key)}: [' if self.key else '['
+
+    def rows(self, rows) -> str:
+        if self.ndjson:
+            return ''.join(f'{self.encode(row)}\n' for row in rows)
+        chunk = ','.join(map(self.encode, rows))
+        if chunk and not self.first:
+            chunk = ',' + chunk
+        self.first = self.first and not chunk
+        return chunk
+
+    def end(self) -> str:
+        if self.ndjson:
+            return ''
+        return ']}' if self.key else ']'
+
+
+def iter_json_rows(queryset: QuerySet, fields, chunk_size=2000, ndjson=False, key=None):
+    """
+    Выгрузка queryset в JSON (или NDJSON) кусками.
 
-def save_csv_products(file, encoding):
-    csv_file = TextIOWrapper(
-        file,
-        encoding=encoding,
-    )
+    Как и iter_csv_rows(), строки читаются через values().iterator()
+    пачками по chunk_size, и каждая пачка отдаётся одним куском.
+    """
+    encoder = JSONRowsEncoder(ndjson=ndjson, key=key)
+    yield encoder.start()
 
-    reader = DictReader(csv_file)
+    chunk = []
+    for row in queryset.values(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield encoder.rows(chunk)
+            chunk = []
 
-    products = [
-        Product(**row)
-        for row in reader
-    ]
-    Product.objects.bulk_create(products)
-    return products
+    yield encoder.rows(chunk) + encoder.end()
 
 
-def save_csv_orders(file, encoding):
-    csv_file = TextIOWrapper(
-        file,
-        encoding=encoding,
-    )
+async def aiter_json_rows(queryset: QuerySet, fields, chunk_size=2000, ndjson=False, key=None):
+    """Асинхронная iter_json_rows() для ответов под ASGI."""
+    encoder = JSONRowsEncoder(ndjson=ndjson, key=key)
+    yield encoder.start()
 
-    reader = DictReader(csv_file)
+    chunk = []
+    async for row in queryset.values(*fields).aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield encoder.rows(chunk)
+            chunk = []
 
-    orders = [
-        Order(**row)
-        for row in reader
-    ]
-    Order.objects.bulk_create(orders)
-    return orders
+    yield encoder.rows(chunk) + encoder.end()
@@ -0,0 +1,114 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) по поколениям данных.
+
+Валидаторы ответа строятся из поколений групп данных, от которых он
+зависит (:mod:`shopapp.caching`), и времени их последнего изменения -
+одним чтением из кэша, без запросов к базе и без построения тела.
+Если клиент прислал совпадающий If-None-Match (или If-Modified-Since),
+ему отдаётся пустой 304.
+
+Кроме поколений в ETag входят параметры запроса (фильтры, формат,
+курсор страницы), язык и заголовок Accept, а с vary_on_user - и
+пользователь: по одному URL разным клиентам могут отдаваться разные тела.
+"""
+
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import generation_key, get_generation, get_modified, modified_key
+
+
+def get_validators(request, *names, vary_on_user: bool = False) -> tuple:
+    """ETag и Last-Modified (timestamp) ответа на request, зависящего от групп данных names."""
+    keys = [key for name in names for key in (generation_key(name), modified_key(name))]
+    values = cache.get_many(keys)
+    generations = [values.get(generation_key(name)) or get_generation(name) for name in names]
+    modified = [values.get(modified_key(name)) or get_modified(name) for name in names]
+    return make_etag(request, generations, vary_on_user), max(modified)
+
+
+async def aget_validators(request, *names, vary_on_user: bool = False) -> tuple:
+    """Асинхронная get_validators()."""
+    keys = [key for name in names for key in (generation_key(name), modified_key(name))]
+    values = await cache.aget_many(keys)
+    if len(values) < len(keys):
+        # счётчики вытеснены из кэша - заводим их заново, это бывает редко
+        return await sync_to_async(get_validators)(request, *names, vary_on_user=vary_on_user)
+    generations = [values[generation_key(name)] for name in names]
+    modified = [values[modified_key(name)] for name in names]
+    return make_etag(request, generations, vary_on_user), max(modified)
+
+
+def make_etag(request, generations, vary_on_user: bool = False) -> str:
+    """ETag по поколениям; с vary_on_user читается request.user, в async-представлениях так нельзя."""
+    variant = [
+        generations,
+        sorted(request.GET.lists()),
+        getattr(request, 'LANGUAGE_CODE', None),
+        request.META.get('HTTP_ACCEPT', ''),
+    ]
+    if vary_on_user:
+        variant.append(request.user.pk)
+    return quote_etag(md5(repr(variant).encode()).hexdigest())
+
+
+def not_modified_response(request, etag: str, last_modified: float):
+    """Ответ 304, если у клиента актуальная версия, иначе None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    return set_validators(
+        get_conditional_response(request, etag=etag, last_modified=int(last_modified)),
+        etag,
+        last_modified,
+    )
+
+
+def set_validators(response, etag: str, last_modified: float):
+    """Заголовки ETag и Last-Modified успешного ответа (response может быть None)."""
+    if response is not None and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(int(last_modified)))
+    return response
+
+
+def conditional_get(*names, vary_on_user: bool = False):
+    """
+    Декоратор представления, ответ которого зависит только от групп данных names.
+
+    Для методов классов - через method_decorator. Асинхронные методы он
+    (в Django 4.2) делает синхронными, поэтому в них используются
+    aget_validators() и not_modified_response() напрямую.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_inner(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                etag, last_modified = await aget_validators(request, *names, vary_on_user=vary_on_user)
+                response = not_modified_response(request, etag, last_modified)
+                if response is None:
+                    response = set_validators(await view(request, *args, **kwargs), etag, last_modified)
+                return response
+
+            return async_inner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag, last_modified = get_validators(request, *names, vary_on_user=vary_on_user)
+            response = not_modified_response(request, etag, last_modified)
+            if response is None:
+                response = set_validators(view(request, *args, **kwargs), etag, last_modified)
+            return response
+
+        return inner
+
+    return decorator
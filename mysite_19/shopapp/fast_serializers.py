@@ -0,0 +1,159 @@
+"""
+Быстрый путь сериализации списков только для чтения.
+
+ModelSerializer для каждой строки создаёт экземпляр модели, а затем для
+каждого поля вызывает get_attribute() и to_representation() и собирает
+OrderedDict. FastListSerializer вместо этого получает строки values()
+и собирает словари по заранее подготовленному плану полей: значения
+простых полей (строки, числа, bool, pk связей) берутся из БД как есть,
+и только поля с настоящим преобразованием (Decimal, даты, файлы) вызывают
+свою функцию. В ответе получаются только str/int/bool/None, так что
+JSONRenderer кодирует их целиком в C-части модуля json, ни разу не
+вызывая JSONEncoder.default(). Результат совпадает с обычным путём байт
+в байт (это проверяют тесты и ``manage.py bench_serializers``).
+
+Поля с source через точку или '*', many-связи, вложенные сериализаторы
+и SerializerMethodField быстрым путём не поддерживаются - для таких
+сериализаторов, как и для списков экземпляров моделей, работает
+обычный ListSerializer.
+"""
+
+from django.db.models import Manager, QuerySet
+from django.db.models.query import ModelIterable
+from rest_framework import fields, relations, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Поля, у которых to_representation() значения из БД ничего не меняет
+PLAIN_REPRESENTATIONS = {
+    fields.CharField.to_representation,
+    fields.IntegerField.to_representation,
+    fields.BooleanField.to_representation,
+    fields.ReadOnlyField.to_representation,
+}
+
+UNSUPPORTED = object()
+
+
+def file_converter(field, model_field):
+    """Как FileField.to_representation(), но по имени файла из values()."""
+    storage = model_field.storage
+    request = field.context.get('request')
+    use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+    def convert(name):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return convert
+
+
+def field_converter(field, model):
+    """
+    Функция "значение из values() -> представление" для поля сериализатора.
+
+    None - значение берётся как есть, UNSUPPORTED - поле быстрым путём не сериализуется.
+    """
+    if (
+        isinstance(field, (serializers.BaseSerializer, relations.ManyRelatedField, fields.SerializerMethodField))
+        or field.source == '*'
+        or '.' in field.source
+    ):
+        return UNSUPPORTED
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return None if field.pk_field is None else field.pk_field.to_representation
+    if isinstance(field, relations.RelatedField):
+        return UNSUPPORTED
+    if isinstance(field, fields.FileField):
+        return file_converter(field, model._meta.get_field(field.source))
+    if type(field).to_representation in PLAIN_REPRESENTATIONS:
+        return None
+    return field.to_representation
+
+
+class FastListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer, который сериализует строки values() без экземпляров моделей.
+
+    Подключается через Meta.list_serializer_class у ModelSerializer.
+    QuerySet моделей сам переводится в values(), а готовые строки
+    (словари) приходят от FastListModelMixin после пагинации.
+    """
+
+    def get_plan(self):
+        """[(имя поля, ключ в values(), функция или None)] или None, если быстрый путь невозможен."""
+        if not hasattr(self, '_plan'):
+            model = self.child.Meta.model
+            plan = []
+            for field in self.child._readable_fields:
+                converter = field_converter(field, model)
+                if converter is UNSUPPORTED:
+                    plan = None
+                    break
+                plan.append((field.field_name, field.source, converter))
+            self._plan = plan
+        return self._plan
+
+    def values(self, queryset: QuerySet):
+        """
+        queryset в виде values() с полями сериализатора, None - если быстрый путь невозможен.
+
+        В values() попадают и поля сортировки - по ним KeysetPagination строит курсор.
+        """
+        plan = self.get_plan()
+        if plan is None:
+            return None
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        names = [source for _, source, _ in plan] + ['pk']
+        names += [name.lstrip('-') for name in ordering if isinstance(name, str) and name != '?']
+        return queryset.values(*dict.fromkeys(names))
+
+    def to_representation(self, data):
+        plan = self.get_plan()
+        if plan is None:
+            return super().to_representation(data)
+        if isinstance(data, Manager):
+            data = data.all()
+        if isinstance(data, QuerySet) and data._iterable_class is ModelIterable:
+            data = self.values(data)
+
+        rows = list(data)
+        if rows and not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+        return [self.represent(row, plan) for row in rows]
+
+    @staticmethod
+    def represent(row: dict, plan) -> dict:
+        # как Serializer.to_representation(): None отдаётся без преобразования
+        ret = {}
+        for name, source, converter in plan:
+            value = row[source]
+            ret[name] = value if converter is None or value is None else converter(value)
+        return ret
+
+
+class FastListModelMixin:
+    """
+    list() для ViewSet с FastListSerializer: queryset пагинируется уже как values(),
+    так что экземпляры моделей для страницы не создаются.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset, many=True)
+        if isinstance(serializer, FastListSerializer):
+            values = serializer.values(queryset)
+            if values is not None:
+                queryset = values
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
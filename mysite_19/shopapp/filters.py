@@ -0,0 +1,23 @@
+"""
+Наборы фильтров django-filter для представлений вне DRF ViewSet.
+"""
+
+from django_filters import BooleanFilter, CharFilter, FilterSet, IsoDateTimeFilter, NumberFilter
+
+from .models import Product
+
+
+class ProductExportFilter(FilterSet):
+    """Фильтры выгрузки товаров: ?name=, ?min_price=, ?archived=, ?modified_since= и т.д."""
+
+    name = CharFilter(lookup_expr='icontains')
+    min_price = NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = NumberFilter(field_name='price', lookup_expr='lte')
+    min_quantity = NumberFilter(field_name='quantity', lookup_expr='gte')
+    archived = BooleanFilter()
+    has_additional_guarantee = BooleanFilter()
+    modified_since = IsoDateTimeFilter(field_name='updated_at', lookup_expr='gte')
+
+    class Meta:
+        model = Product
+        fields = []
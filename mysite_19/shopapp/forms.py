@@ -36,4 +36,20 @@ class GroupForm(forms.ModelForm):
 
 class CSVImportForm(forms.Form):
     csv_file = forms.FileField()
+    run_in_background = forms.BooleanField(
+        initial=True,
+        required=False,
+        help_text='Large files should be imported in background to avoid request timeouts.',
+    )
+
+
+class ProductCSVImportForm(CSVImportForm):
+    upsert_key = forms.ChoiceField(
+        label='Match existing products on',
+        choices=[
+            ('', 'Nothing (insert all rows)'),
+            ('name', 'Name'),
+        ],
+        required=False,
+    )
 
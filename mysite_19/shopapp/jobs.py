@@ -0,0 +1,135 @@
+"""
+Фоновые задачи импорта и экспорта CSV.
+
+Задачи хранятся в таблице :model:`shopapp.Job` и выполняются пулом потоков
+внутри процесса, поэтому внешний брокер не нужен. Клиент сразу получает id
+задачи и опрашивает её статус (это может только автор задачи или staff),
+а готовый файл экспорта лежит в PRIVATE_MEDIA_ROOT и отдаётся через
+представление с той же проверкой прав.
+
+SHOP_JOBS_WORKERS задаёт размер пула, SHOP_JOBS_EAGER=True выполняет
+задачи сразу в текущем потоке (удобно в тестах).
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .common import save_csv_products, save_csv_orders, iter_csv_rows
+from .models import Job
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SHOP_JOBS_WORKERS', 2),
+                thread_name_prefix='shop-job',
+            )
+    return _executor
+
+
+def submit(job: Job, func, *args) -> Job:
+    """Постановка задачи в пул после коммита транзакции, в которой создан Job."""
+    if getattr(settings, 'SHOP_JOBS_EAGER', False):
+        run(job.pk, func, *args)
+        job.refresh_from_db()
+        return job
+
+    transaction.on_commit(lambda: get_executor().submit(run, job.pk, func, *args))
+    return job
+
+
+def run(job_id, func, *args) -> None:
+    eager = getattr(settings, 'SHOP_JOBS_EAGER', False)
+    if not eager:
+        close_old_connections()
+
+    job = Job.objects.get(pk=job_id)
+    job.status = Job.Status.RUNNING
+    job.save(update_fields=['status'])
+    try:
+        func(job, *args)
+    except Exception as exc:
+        log.exception('Job %s failed', job.pk)
+        job.status = Job.Status.FAILED
+        job.error = str(exc)
+    else:
+        job.status = Job.Status.DONE
+    finally:
+        job.finished_at = timezone.now()
+        job.save()
+        if not eager:
+            close_old_connections()
+
+
+def set_progress(job: Job, progress: int) -> None:
+    job.progress = progress
+    Job.objects.filter(pk=job.pk).update(progress=progress)
+
+
+def start_import(kind: str, uploaded_file, encoding, user=None, **options) -> Job:
+    """Сохранение загруженного CSV и запуск его импорта в фоне."""
+    job = Job(kind=kind, created_by=user if user and user.is_authenticated else None)
+    job.source_file.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    return submit(job, IMPORTERS[kind], encoding, options)
+
+
+def start_products_export(queryset: QuerySet, fields, user=None) -> Job:
+    """Запуск выгрузки отфильтрованных товаров в CSV-файл в PRIVATE_MEDIA_ROOT."""
+    job = Job.objects.create(
+        kind='export_products',
+        created_by=user if user and user.is_authenticated else None,
+    )
+    return submit(job, export_products, queryset, fields)
+
+
+def csv_import_job(save_csv):
+    def job_func(job: Job, encoding, options):
+        try:
+            with job.source_file.open('rb') as file:
+                result = save_csv(
+                    file,
+                    encoding=encoding,
+                    progress=lambda current: set_progress(job, current.rows),
+                    **options,
+                )
+        finally:
+            # загруженный CSV не нужен ни после импорта, ни после ошибки
+            job.source_file.delete(save=False)
+        job.result = result.as_dict()
+
+    return job_func
+
+
+IMPORTERS = {
+    'import_products': csv_import_job(save_csv_products),
+    'import_orders': csv_import_job(save_csv_orders),
+}
+
+
+def export_products(job: Job, queryset: QuerySet, fields) -> None:
+    job.total = queryset.count()
+    written = 0
+    with TemporaryFile() as tmp:
+        for chunk in iter_csv_rows(queryset, fields):
+            tmp.write(chunk.encode())
+            written += chunk.count('\n')
+            set_progress(job, max(written - 1, 0))
+        tmp.seek(0)
+        job.result_file.save(f'products-export-{job.pk}.csv', File(tmp), save=False)
+    job.result = {'rows': job.progress}
@@ -1,7 +1,7 @@
 from django.contrib.auth.models import User
 
 from django.core.management import BaseCommand
-from django.db.models import Avg, Max, Min, Count, Sum
+from django.db.models import Avg, Max, Min
 
 from shopapp.models import Product, Order
 
@@ -14,13 +14,11 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Start deme aggregate')
 
-        orders = Order.objects.annotate(
-            total=Sum('products__price', default=0),  # Обращаемся к продуктам, и внутри каждого продукта - к цене
-            products_count=Count('products')
-        )
+        # total и items_count денормализованы в Order, JOIN с товарами не нужен
+        orders = Order.objects.only('pk', 'total', 'items_count').order_by('-total')
         for order in orders:
             print(
-                f'Order #{order.id} with {order.products_count} products worth {order.total}.'
+                f'Order #{order.id} with {order.items_count} products worth {order.total}.'
             )
 
         # result = Product.objects.filter(
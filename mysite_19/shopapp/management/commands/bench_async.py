@@ -0,0 +1,176 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from statistics import median, quantiles
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+
+DEFAULT_PATHS = [
+    '/api/hello/',
+    '/en/accounts/foo-bar',
+    '/en/shop/products/export/',
+]
+
+SERVERS = {
+    'sync': ('mysite_19.wsgi:application', 'sync'),
+    'asgi': ('mysite_19.asgi:application', 'uvicorn.workers.UvicornWorker'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Measure concurrent-request throughput of the JSON endpoints
+    under sync (WSGI) and uvicorn (ASGI) gunicorn workers
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server',
+            action='append',
+            choices=list(SERVERS),
+            help='Start gunicorn in this mode on a free port and benchmark it (default: both)',
+        )
+        parser.add_argument('--url', help='Benchmark an already running server instead, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', help=f'Paths to request (default: {DEFAULT_PATHS})')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        paths = options['path'] or DEFAULT_PATHS
+        self.stdout.write(
+            f'{options["requests"]} requests per path, {options["concurrency"]} concurrent, '
+            f'{options["workers"]} worker(s), latency in milliseconds'
+        )
+        self.stdout.write(f'{"server":<6} {"path":<32} {"req/sec":>8} {"median":>8} {"p99":>8} {"errors":>6}')
+
+        if options['url']:
+            self.run_all('url', options['url'], paths, options)
+            return
+
+        for mode in options['server'] or SERVERS:
+            port = self.free_port()
+            process = self.start_server(mode, port, options['workers'])
+            try:
+                self.run_all(mode, f'http://127.0.0.1:{port}', paths, options)
+            finally:
+                process.terminate()
+                process.wait()
+
+    def run_all(self, mode, url, paths, options):
+        parts = urlsplit(url)
+        for path in paths:
+            elapsed, timings, errors = asyncio.run(
+                load(parts.hostname, parts.port or 80, path, options['requests'], options['concurrency'])
+            )
+            p99 = quantiles(timings, n=100)[98] if len(timings) > 1 else 0
+            self.stdout.write(
+                f'{mode:<6} {path:<32} {len(timings) / elapsed:>8.0f} '
+                f'{median(timings) * 1e3 if timings else 0:>8.1f} {p99 * 1e3:>8.1f} {errors:>6}'
+            )
+
+    @staticmethod
+    def free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def start_server(self, mode, port, workers) -> subprocess.Popen:
+        app, worker_class = SERVERS[mode]
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', app,
+                '--worker-class', worker_class,
+                '--workers', str(workers),
+                '--bind', f'127.0.0.1:{port}',
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn ({mode}) exited with code {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'gunicorn ({mode}) did not start in 30 seconds')
+
+
+async def load(host, port, path, total, concurrency):
+    """total GET-запросов к path по concurrency keep-alive соединениям."""
+    timings = []
+    errors = 0
+    remaining = total
+
+    async def client():
+        nonlocal remaining, errors
+        reader = writer = None
+        while remaining > 0:
+            remaining -= 1
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            try:
+                status, keep_alive = await request(reader, writer, host, path)
+            except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+                errors += 1
+                writer.close()
+                writer = None
+                continue
+            timings.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+            if not keep_alive:
+                # синхронные воркеры gunicorn закрывают соединение после каждого ответа
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, timings, errors
+
+
+async def request(reader, writer, host, path) -> tuple:
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode())
+    await writer.drain()
+
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+        elif name == 'connection' and 'close' in value.lower():
+            keep_alive = False
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        raise ValueError('Response without Content-Length')
+    return status, keep_alive
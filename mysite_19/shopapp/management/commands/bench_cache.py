@@ -0,0 +1,59 @@
+from pathlib import Path
+from statistics import median, quantiles
+from tempfile import TemporaryDirectory
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+from django.utils.module_loading import import_string
+
+
+BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', 'file-cache'),
+    'sqlite': ('mysite_19.sqlite_cache.SQLiteCache', 'cache.sqlite3'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'bench'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Compare get/set latency of cache backends
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument('--backend', action='append', choices=list(BACKENDS))
+
+    def handle(self, *args, **options):
+        keys = [f'bench:{i}' for i in range(options['keys'])]
+        value = {'payload': 'x' * options['value_size'], 'items': list(range(20))}
+
+        self.stdout.write(
+            f'{len(keys)} keys, ~{options["value_size"]} bytes per value, latency in microseconds'
+        )
+        self.stdout.write(f'{"backend":<8} {"op":<4} {"median":>8} {"p99":>8} {"ops/sec":>10}')
+
+        with TemporaryDirectory() as tmp:
+            for name in options['backend'] or BACKENDS:
+                path, location = BACKENDS[name]
+                cache = import_string(path)(
+                    str(Path(tmp) / location),
+                    {'OPTIONS': {'MAX_ENTRIES': len(keys) * 2}},
+                )
+                cache.clear()
+                self.report(name, 'set', [self.timed(cache.set, key, value) for key in keys])
+                self.report(name, 'get', [self.timed(cache.get, key) for key in keys])
+                cache.close()
+
+    @staticmethod
+    def timed(func, *args):
+        started = default_timer()
+        func(*args)
+        return default_timer() - started
+
+    def report(self, name, operation, timings):
+        p99 = quantiles(timings, n=100)[98]
+        self.stdout.write(
+            f'{name:<8} {operation:<4} {median(timings) * 1e6:>8.1f} {p99 * 1e6:>8.1f} '
+            f'{len(timings) / sum(timings):>10.0f}'
+        )
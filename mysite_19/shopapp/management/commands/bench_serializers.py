@@ -0,0 +1,81 @@
+from statistics import median
+from timeit import default_timer
+
+from django.contrib.auth.models import Group
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from myapiapp.serializers import GroupSerializer
+from shopapp.models import Product
+from shopapp.serializers import ProductSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Compare ModelSerializer and FastListSerializer on 10/100/1000-item pages
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = options['sizes']
+        request = RequestFactory().get('/')
+        renderer = JSONRenderer()
+
+        self.stdout.write(
+            f'Page fetch + serialization + JSON rendering, median of {options["repeat"]} runs in milliseconds'
+        )
+        self.stdout.write(f'{"serializer":<12} {"items":>6} {"model":>9} {"fast":>9} {"speedup":>8}')
+
+        # тестовые строки создаются в транзакции и откатываются в конце
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    Product(name=f'Bench product {i}', description='Description ' * 5, price=i / 7, quantity=i % 100)
+                    for i in range(max(sizes))
+                )
+                Group.objects.bulk_create(Group(name=f'bench-group-{i}') for i in range(max(sizes)))
+
+                for name, serializer_class, queryset in [
+                    ('product', ProductSerializer, Product.objects.filter(name__startswith='Bench product')),
+                    ('group', GroupSerializer, Group.objects.filter(name__startswith='bench-group').order_by('pk')),
+                ]:
+                    for size in sizes:
+                        self.compare(name, serializer_class, queryset[:size], request, renderer, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def compare(self, name, serializer_class, queryset, request, renderer, repeat):
+        context = {'request': request}
+
+        def model_path():
+            # список экземпляров - обычный ModelSerializer для каждой строки
+            return renderer.render(serializer_class(list(queryset.all()), many=True, context=context).data)
+
+        def fast_path():
+            return renderer.render(serializer_class(queryset.all(), many=True, context=context).data)
+
+        if model_path() != fast_path():
+            raise CommandError(f'{name}: fast serializer output differs from ModelSerializer')
+
+        model_time = median(self.timed(model_path) for _ in range(repeat))
+        fast_time = median(self.timed(fast_path) for _ in range(repeat))
+        self.stdout.write(
+            f'{name:<12} {queryset.count():>6} {model_time * 1e3:>9.2f} {fast_time * 1e3:>9.2f} '
+            f'{model_time / fast_time:>7.1f}x'
+        )
+
+    @staticmethod
+    def timed(func):
+        started = default_timer()
+        func()
+        return default_timer() - started
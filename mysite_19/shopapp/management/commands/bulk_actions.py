@@ -1,7 +1,9 @@
 from django.contrib.auth.models import User
 
 from django.core.management import BaseCommand
+from django.utils import timezone
 
+from shopapp.caching import PRODUCTS, bump_generation
 from shopapp.models import Product
 
 
@@ -15,7 +17,8 @@ class Command(BaseCommand):
 
         result = Product.objects.filter(
             name__contains='Smartphone',
-        ).update(has_additional_guarantee=True)
+        ).update(has_additional_guarantee=True, updated_at=timezone.now())
+        bump_generation(PRODUCTS)
 
         print(result)
 
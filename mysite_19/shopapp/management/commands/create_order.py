@@ -26,8 +26,7 @@ class Command(BaseCommand):
             user=user,
         )
 
-        for product in products:
-            order.products.add(product)
+        order.products.add(*products)
 
         order.save()
 
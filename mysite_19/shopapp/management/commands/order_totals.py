@@ -0,0 +1,55 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from shopapp.models import Order
+from shopapp.totals import find_stale_totals, refresh_order_totals
+
+
+class Command(BaseCommand):
+    """
+    Verify and rebuild denormalized Order.total / Order.items_count
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report orders with stale totals, exit with an error if there are any',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = 0
+        stale_count = 0
+        last_pk = 0
+
+        while True:
+            order_ids = list(
+                Order.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            last_pk = order_ids[-1]
+            checked += len(order_ids)
+
+            stale = find_stale_totals(order_ids)
+            stale_count += len(stale)
+            for order_id, saved, expected in stale:
+                self.stdout.write(
+                    f'Order #{order_id}: saved {saved[0]} / {saved[1]} items, '
+                    f'expected {expected[0]} / {expected[1]} items'
+                )
+            if stale and not options['check']:
+                with transaction.atomic():
+                    refresh_order_totals(order_id for order_id, _, _ in stale)
+
+        if options['check']:
+            if stale_count:
+                raise CommandError(f'{stale_count} of {checked} orders have stale totals')
+            self.stdout.write(self.style.SUCCESS(f'All {checked} orders have correct totals'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} orders, fixed {stale_count}'))
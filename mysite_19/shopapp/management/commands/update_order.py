@@ -12,8 +12,7 @@ class Command(BaseCommand):
 
         products = Product.objects.all()
 
-        for product in products:
-            order.products.add(product)
+        order.products.add(*products)
 
         order.save()
 
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+# SQL полнотекстового индекса записан здесь, а не импортируется из
+# shopapp.search, чтобы правки модуля не меняли историю миграций.
+SQLITE_CREATE_FTS = [
+    "CREATE VIRTUAL TABLE shopapp_product_fts USING fts5("
+    "name, description, content='shopapp_product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER shopapp_product_fts_ai AFTER INSERT ON shopapp_product BEGIN "
+    "INSERT INTO shopapp_product_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER shopapp_product_fts_ad AFTER DELETE ON shopapp_product BEGIN "
+    "INSERT INTO shopapp_product_fts (shopapp_product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER shopapp_product_fts_au AFTER UPDATE OF name, description ON shopapp_product BEGIN "
+    "INSERT INTO shopapp_product_fts (shopapp_product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO shopapp_product_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO shopapp_product_fts (shopapp_product_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_FTS = [
+    "DROP TRIGGER IF EXISTS shopapp_product_fts_ai",
+    "DROP TRIGGER IF EXISTS shopapp_product_fts_ad",
+    "DROP TRIGGER IF EXISTS shopapp_product_fts_au",
+    "DROP TABLE IF EXISTS shopapp_product_fts",
+]
+POSTGRESQL_CREATE_FTS = [
+    "ALTER TABLE shopapp_product ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', "
+    "coalesce(name, '') || ' ' || coalesce(description, ''))) STORED",
+    "CREATE INDEX shopapp_product_search_vector_idx ON shopapp_product USING GIN (search_vector)",
+]
+POSTGRESQL_DROP_FTS = [
+    "ALTER TABLE shopapp_product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_statements(statements):
+    """Операция для RunPython: statements - {vendor: [SQL]}, остальные СУБД пропускаются."""
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+
+    return run
+
+
+create_fts = run_statements(
+    {"sqlite": SQLITE_CREATE_FTS, "postgresql": POSTGRESQL_CREATE_FTS}
+)
+drop_fts = run_statements({"sqlite": SQLITE_DROP_FTS, "postgresql": POSTGRESQL_DROP_FTS})
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shopapp", "0009_job"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="description",
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
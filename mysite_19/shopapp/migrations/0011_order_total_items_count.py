@@ -0,0 +1,45 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model("shopapp", "Order")
+    OrderProducts = Order.products.through
+    totals = (
+        OrderProducts.objects.values("order_id")
+        .annotate(total=Sum("product__price"), items_count=Count("pk"))
+        .order_by()
+    )
+    orders = [
+        Order(pk=row["order_id"], total=row["total"], items_count=row["items_count"])
+        for row in totals
+    ]
+    Order.objects.bulk_update(orders, ["total", "items_count"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shopapp", "0010_product_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="items_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=12,
+            ),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
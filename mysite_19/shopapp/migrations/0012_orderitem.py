@@ -0,0 +1,112 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_order_products(apps, schema_editor):
+    """Позиции из старой таблицы shopapp_order_products: количество 1, цена - текущая цена товара."""
+    Order = apps.get_model("shopapp", "Order")
+    OrderItem = apps.get_model("shopapp", "OrderItem")
+    OrderProducts = Order.products.through
+
+    rows = (
+        OrderProducts.objects.order_by("pk")
+        .values_list("order_id", "product_id", "product__price")
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for order_id, product_id, price in rows:
+        batch.append(
+            OrderItem(
+                order_id=order_id, product_id=product_id, quantity=1, unit_price=price
+            )
+        )
+        if len(batch) >= 1000:
+            OrderItem.objects.bulk_create(batch)
+            batch = []
+    OrderItem.objects.bulk_create(batch)
+
+
+def copy_order_items(apps, schema_editor):
+    Order = apps.get_model("shopapp", "Order")
+    OrderItem = apps.get_model("shopapp", "OrderItem")
+    OrderProducts = Order.products.through
+
+    OrderProducts.objects.bulk_create(
+        [
+            OrderProducts(order_id=order_id, product_id=product_id)
+            for order_id, product_id in OrderItem.objects.values_list(
+                "order_id", "product_id"
+            ).iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shopapp", "0011_order_total_items_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(default=1)),
+                (
+                    "unit_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=9, null=True
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="shopapp.order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_items",
+                        to="shopapp.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Order item",
+                "verbose_name_plural": "Order items",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="orderitem",
+            constraint=models.UniqueConstraint(
+                fields=("order", "product"), name="shopapp_orderitem_unique_product"
+            ),
+        ),
+        migrations.RunPython(copy_order_products, copy_order_items),
+        migrations.RemoveField(
+            model_name="order",
+            name="products",
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="products",
+            field=models.ManyToManyField(
+                related_name="orders", through="shopapp.OrderItem", to="shopapp.product"
+            ),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+# SQL полнотекстового индекса записан здесь, а не импортируется из
+# shopapp.search, чтобы правки модуля не меняли историю миграций.
+SQLITE_CREATE_FTS = [
+    "CREATE VIRTUAL TABLE shopapp_product_fts USING fts5("
+    "name, description, content='shopapp_product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER shopapp_product_fts_ai AFTER INSERT ON shopapp_product BEGIN "
+    "INSERT INTO shopapp_product_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER shopapp_product_fts_ad AFTER DELETE ON shopapp_product BEGIN "
+    "INSERT INTO shopapp_product_fts (shopapp_product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER shopapp_product_fts_au AFTER UPDATE OF name, description ON shopapp_product BEGIN "
+    "INSERT INTO shopapp_product_fts (shopapp_product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO shopapp_product_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO shopapp_product_fts (shopapp_product_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP_FTS = [
+    "DROP TRIGGER IF EXISTS shopapp_product_fts_ai",
+    "DROP TRIGGER IF EXISTS shopapp_product_fts_ad",
+    "DROP TRIGGER IF EXISTS shopapp_product_fts_au",
+    "DROP TABLE IF EXISTS shopapp_product_fts",
+]
+
+
+def sqlite_statements(statements):
+    """На SQLite AddField пересоздаёт таблицу, и триггеры FTS5 теряются."""
+
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return run
+
+
+def fill_updated_at(apps, schema_editor):
+    """Существующие записи считаются изменёнными в момент создания."""
+    Product = apps.get_model("shopapp", "Product")
+    Order = apps.get_model("shopapp", "Order")
+    Product.objects.update(updated_at=F("date_received"))
+    Order.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shopapp", "0013_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            sqlite_statements(SQLITE_DROP_FTS), sqlite_statements(SQLITE_CREATE_FTS)
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["updated_at", "id"], name="shopapp_order_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["updated_at", "id"], name="shopapp_product_updated_idx"
+            ),
+        ),
+        migrations.RunPython(
+            sqlite_statements(SQLITE_CREATE_FTS), sqlite_statements(SQLITE_DROP_FTS)
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+import mysite_19.storage
+import shopapp.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shopapp", "0014_product_order_updated_at"),
+    ]
+
+    # storage и upload_to в базе не хранятся, а AlterField на SQLite
+    # пересоздал бы таблицы (и потерял бы триггеры FTS5 у shopapp_product)
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="order",
+                    name="receipt",
+                    field=models.FileField(
+                        null=True,
+                        storage=mysite_19.storage.content_addressed_storage,
+                        upload_to="orders/receipts/",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="product",
+                    name="preview",
+                    field=models.ImageField(
+                        blank=True,
+                        null=True,
+                        storage=mysite_19.storage.content_addressed_storage,
+                        upload_to=shopapp.models.product_preview_directory_path,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="productimage",
+                    name="image",
+                    field=models.ImageField(
+                        storage=mysite_19.storage.content_addressed_storage,
+                        upload_to=shopapp.models.product_images_directory_path,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+import mysite_19.storage
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shopapp", "0015_content_addressed_storage"),
+    ]
+
+    # storage в базе не хранится, см. 0015_content_addressed_storage
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="job",
+                    name="result_file",
+                    field=models.FileField(
+                        blank=True,
+                        null=True,
+                        storage=mysite_19.storage.private_storage,
+                        upload_to="jobs/results/",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="job",
+                    name="source_file",
+                    field=models.FileField(
+                        blank=True,
+                        null=True,
+                        storage=mysite_19.storage.private_storage,
+                        upload_to="jobs/sources/",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,13 +1,16 @@
+from uuid import uuid4
+
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.db import models
 
+from mysite_19.storage import content_addressed_storage, private_storage
+
 
+# Каталоги загрузок не зависят от pk (у нового объекта его ещё нет):
+# имя файла всё равно заменяется на SHA-256 содержимого, см. mysite_19.storage
 def product_preview_directory_path(instance: 'Product', filename: str) -> str:
-    return 'products/product_{pk}/preview/{filename}'.format(
-        pk=instance.pk,
-        filename=filename,
-    )
+    return 'products/preview/{filename}'.format(filename=filename)
 
 
 class Product(models.Model):
@@ -21,15 +24,25 @@ class Product(models.Model):
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
         ordering = ['name', 'price']
+        indexes = [
+            # выборка изменений (?modified_since=) с keyset-продолжением по (updated_at, pk)
+            models.Index(fields=['updated_at', 'id'], name='shopapp_product_updated_idx'),
+        ]
 
     name = models.CharField(max_length=100, db_index=True)
-    description = models.TextField(null=False, blank=True, db_index=True)
+    description = models.TextField(null=False, blank=True)
     price = models.DecimalField(max_digits=9, decimal_places=2, default=0, db_index=True)
     quantity = models.PositiveSmallIntegerField(default=0, db_index=True)
     date_received = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     has_additional_guarantee = models.BooleanField(default=False)
     archived = models.BooleanField(default=False)
-    preview = models.ImageField(null=True, blank=True, upload_to=product_preview_directory_path)
+    preview = models.ImageField(
+        null=True,
+        blank=True,
+        upload_to=product_preview_directory_path,
+        storage=content_addressed_storage,
+    )
 
     created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.PROTECT)
 
@@ -38,15 +51,12 @@ class Product(models.Model):
 
 
 def product_images_directory_path(instance: 'ProductImage', filename: str) -> str:
-    return 'products/product_{pk}/images/{filename}'.format(
-        pk=instance.product.pk,
-        filename=filename,
-    )
+    return 'products/images/{filename}'.format(filename=filename)
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to=product_images_directory_path)
+    image = models.ImageField(upload_to=product_images_directory_path, storage=content_addressed_storage)
     description = models.CharField(max_length=200, null=False, blank=True)
 
     order = models.OneToOneField('Order', on_delete=models.CASCADE, null=True)
@@ -55,15 +65,140 @@ class ProductImage(models.Model):
 class Order(models.Model):
     delivery_address = models.TextField(null=False, blank=True)
     promocode = models.CharField(max_length=20, null=False, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    receipt = models.FileField(null=True, upload_to='orders/receipts/')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    receipt = models.FileField(null=True, upload_to='orders/receipts/', storage=content_addressed_storage)
 
     user = models.ForeignKey(User, on_delete=models.PROTECT, null=True)
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, through='OrderItem', related_name='orders')
+
+    # Денормализованные итоги по позициям заказа, их поддерживает shopapp.totals
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, db_index=True)
+    items_count = models.PositiveIntegerField(default=0, editable=False, db_index=True)
 
     class Meta:
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='shopapp_order_updated_idx'),
+        ]
 
     def __str__(self):
-        return f'{[self.delivery_address, self.promocode, self.user.pk]!r}'
+        return f'{[self.delivery_address, self.promocode, self.user_id]!r}'
+
+
+class OrderItem(models.Model):
+    """
+    Позиция заказа: товар, количество и цена на момент покупки.
+
+    unit_price, не переданная при добавлении товара в заказ
+    (order.products.add(product)), заполняется текущей ценой товара,
+    и дальнейшие изменения цены на заказ уже не влияют.
+    """
+
+    class Meta:
+        verbose_name = _('Order item')
+        verbose_name_plural = _('Order items')
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='shopapp_orderitem_unique_product'),
+        ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        super().save(*args, **kwargs)
+
+    def __str__(self) -> str:
+        return f'{self.quantity} x product {self.product_id} for ${self.unit_price}'
+
+
+class DailyProductSales(models.Model):
+    """
+    Продажи товара за день: свёртка позиций заказов по Order.created_at.
+
+    Таблицы Daily*Sales наполняет ``manage.py refresh_rollups``
+    (см. :mod:`shopapp.rollups`), отчёты API читают только их.
+    """
+
+    class Meta:
+        verbose_name = _('Daily product sales')
+        verbose_name_plural = _('Daily product sales')
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='shopapp_dailyproductsales_unique_day'),
+        ]
+
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    orders_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class DailyUserSales(models.Model):
+    """Покупки пользователя за день, user=None - заказы без пользователя."""
+
+    class Meta:
+        verbose_name = _('Daily user sales')
+        verbose_name_plural = _('Daily user sales')
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user'], name='shopapp_dailyusersales_unique_day'),
+        ]
+
+    day = models.DateField()
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='daily_sales')
+    orders_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class RollupWatermark(models.Model):
+    """До какого момента (по Order.created_at) свёртки уже посчитаны."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.value}'
+
+
+class Job(models.Model):
+    """
+    Фоновая задача импорта или экспорта CSV.
+
+    Задачи выполняет пул потоков из :mod:`shopapp.jobs`,
+    а клиент опрашивает статус по id.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    class Meta:
+        verbose_name = _('Job')
+        verbose_name_plural = _('Jobs')
+        ordering = ['-created_at']
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=False, blank=True)
+    # Файлы задач содержат выгруженные данные, поэтому лежат вне MEDIA_ROOT
+    source_file = models.FileField(null=True, blank=True, upload_to='jobs/sources/', storage=private_storage)
+    result_file = models.FileField(null=True, blank=True, upload_to='jobs/results/', storage=private_storage)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+
+    def __str__(self) -> str:
+        return f'Job {self.kind} {self.pk} ({self.status})'
@@ -0,0 +1,154 @@
+"""
+Массовое создание и выгрузка заказов.
+
+Заказы и их позиции вставляются через bulk_create в одной транзакции,
+итоги (Order.total, Order.items_count) считаются сразу при вставке,
+так что сигналы m2m_changed и пересчёт не нужны. Цены и существование
+товаров и пользователей проверяются заранее одним IN-запросом на каждую
+таблицу (см. :func:`check_order_relations`).
+
+Выгрузка (:func:`aiter_orders_json`) читает заказы и их позиции двумя
+запросами через values() и собирает JSON без создания экземпляров моделей.
+"""
+
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import QuerySet
+
+from .caching import ORDERS, PRODUCTS, bump_generation
+from .models import Order, OrderItem, Product
+
+BATCH_SIZE = 1000
+
+
+def check_order_relations(orders: list) -> list:
+    """
+    Проверка товаров и пользователей заказов, по одному IN-запросу на таблицу.
+
+    orders - данные заказов вида {'user_id': ..., 'items': [{'product_id': ..., 'quantity': ...}]}.
+    Позициям проставляется unit_price - текущая цена товара.
+    Возвращается список ошибок по заказам (пустой словарь, если ошибок нет).
+    """
+    product_ids = {item['product_id'] for order in orders for item in order.get('items', ())}
+    prices = dict(Product.objects.filter(pk__in=product_ids).order_by().values_list('pk', 'price'))
+    user_ids = {order['user_id'] for order in orders if order.get('user_id') is not None}
+    existing_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+    errors = []
+    for order in orders:
+        order_errors = {}
+        if order.get('user_id') is not None and order['user_id'] not in existing_users:
+            order_errors['user'] = [f'Invalid pk "{order["user_id"]}" - object does not exist.']
+
+        item_errors = []
+        seen = set()
+        # при частичном обновлении (PATCH) позиций может не быть
+        for item in order.get('items', ()):
+            product_id = item['product_id']
+            if product_id not in prices:
+                item_errors.append({'product': [f'Invalid pk "{product_id}" - object does not exist.']})
+            elif product_id in seen:
+                item_errors.append({'product': [f'Product {product_id} is already in this order.']})
+            else:
+                item_errors.append({})
+                item['unit_price'] = prices[product_id]
+            seen.add(product_id)
+        if any(item_errors):
+            order_errors['items'] = item_errors
+
+        errors.append(order_errors)
+    return errors
+
+
+def create_orders(orders: list, batch_size: int = BATCH_SIZE) -> list:
+    """
+    Создание заказов с позициями, проверенных через check_order_relations.
+
+    Возвращаются созданные заказы (с pk).
+    """
+    created = []
+    with transaction.atomic():
+        for order in orders:
+            items = order['items']
+            created.append(Order(
+                user_id=order.get('user_id'),
+                delivery_address=order.get('delivery_address', ''),
+                promocode=order.get('promocode', ''),
+                total=sum(item['quantity'] * item['unit_price'] for item in items),
+                items_count=sum(item['quantity'] for item in items),
+            ))
+        Order.objects.bulk_create(created, batch_size=batch_size)
+
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order_id=order.pk,
+                    product_id=item['product_id'],
+                    quantity=item['quantity'],
+                    unit_price=item['unit_price'],
+                )
+                for order, data in zip(created, orders)
+                for item in data['items']
+            ],
+            batch_size=batch_size,
+        )
+    # как и m2m_changed у Order.products, сбрасываем кэш каталога
+    bump_generation(PRODUCTS)
+    bump_generation(ORDERS)
+    return created
+
+
+# Поля заказа в выгрузке: как у сериализатора Django - все, кроме pk и M2M (products добавляется отдельно)
+EXPORT_FIELDS = [field for field in Order._meta.local_fields if field.serialize]
+
+
+async def aiter_orders_json(orders: QuerySet, chunk_size: int = 500):
+    """
+    Выгрузка заказов в JSON кусками по chunk_size заказов.
+
+    Формат совпадает с serializers.serialize('json', ...) байт в байт,
+    плюс в fields у каждого заказа есть products и items - позиции
+    с количеством и ценой. Позиции читаются одним запросом и
+    группируются по заказам в памяти, заказы - вторым запросом.
+    """
+    # values(), а не values_list(): в Django 4.2 aiterator() у values_list() открывает курсор синхронно
+    items = defaultdict(list)
+    async for row in (
+        OrderItem.objects
+        .filter(order__in=orders.order_by().values('pk'))
+        .order_by('order_id', 'pk')
+        .values('order_id', 'product_id', 'quantity', 'unit_price')
+        .aiterator(chunk_size=2000)
+    ):
+        items[row['order_id']].append(
+            {'product': row['product_id'], 'quantity': row['quantity'], 'unit_price': row['unit_price']}
+        )
+
+    files = [field.name for field in EXPORT_FIELDS if isinstance(field, models.FileField)]
+    names = [(field.name, field.attname) for field in EXPORT_FIELDS]
+    model = Order._meta.label_lower
+    encode = DjangoJSONEncoder().encode
+
+    chunk = []
+    separator = '['
+    async for row in orders.values('pk', *(attname for _, attname in names)).aiterator(chunk_size=chunk_size):
+        fields = {name: row[attname] for name, attname in names}
+        for name in files:
+            # сериализатор Django отдаёт имя файла, '' - если его нет
+            fields[name] = fields[name] or ''
+        order_items = items.pop(row['pk'], [])
+        fields['products'] = [item['product'] for item in order_items]
+        fields['items'] = order_items
+        chunk.append(encode({'model': model, 'pk': row['pk'], 'fields': fields}))
+        if len(chunk) >= chunk_size:
+            yield separator + ', '.join(chunk)
+            chunk = []
+            separator = ', '
+
+    if chunk:
+        yield separator + ', '.join(chunk) + ']'
+    else:
+        yield '[]' if separator == '[' else ']'
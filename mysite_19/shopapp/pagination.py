@@ -0,0 +1,251 @@
+"""
+Keyset (cursor) пагинация.
+
+Вместо OFFSET N следующая страница выбирается условием "строки после
+последней строки предыдущей страницы" по полям сортировки с pk в конце
+для однозначности, и COUNT(*) не выполняется. Поэтому страница 10 000
+стоит столько же, сколько первая, если для полей сортировки есть индекс.
+
+KeysetPagination - для API (DRF), KeysetListMixin - для HTML-списков на
+ListView. Вместо точного COUNT(*) HTML-списки показывают approximate_count().
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q, QuerySet
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# До скольки строк approximate_count() считает точно
+APPROXIMATE_COUNT_LIMIT = 10000
+
+
+def get_ordering(queryset: QuerySet) -> list:
+    """Сортировка queryset с pk в конце, если её там ещё нет."""
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    pk_names = {'pk', queryset.model._meta.pk.name}
+    if not any(field.lstrip('-') in pk_names for field in ordering):
+        ordering.append('pk')
+    return ordering
+
+
+def approximate_count(queryset: QuerySet, limit: int = None) -> tuple:
+    """
+    (число строк, точное ли оно).
+
+    Считается не больше limit + 1 строк (COUNT(*) по подзапросу с LIMIT),
+    так что на большой таблице это стоит как чтение limit строк индекса,
+    а не всей таблицы. Если строк больше limit (по умолчанию
+    APPROXIMATE_COUNT_LIMIT), возвращается (limit, False).
+    """
+    limit = limit or APPROXIMATE_COUNT_LIMIT
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, False
+    return count, True
+
+
+def keyset_filter(ordering: list, values: list) -> Q:
+    """
+    Условие "строго после values" для сортировки ordering.
+
+    Для ordering ['-price', 'pk'] это price <= v1 AND (price < v1 OR (price = v1 AND pk > v2)).
+    Избыточное условие на первое поле позволяет СУБД начать чтение
+    индекса сразу с нужного места, а не проверять OR для каждой строки.
+    """
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, value in zip(ordering[:position], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+
+    first = ordering[0]
+    lookup = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по курсору для любых полей сортировки (в том числе от OrderingFilter).
+
+    Курсор - это значения полей сортировки последней строки страницы
+    вместе с самой сортировкой, закодированные в base64. Поля сортировки
+    должны быть NOT NULL.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = get_ordering(queryset)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = self.decode_cursor(cursor, queryset.model)
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last_values = self.get_values(page[-1]) if page else None
+        return page
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_values(self, row) -> list:
+        if isinstance(row, dict):
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def get_field(self, model, name):
+        if name == 'pk':
+            return model._meta.pk
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # аннотация (например, search_rank): значение хранится в курсоре как есть
+            return None
+
+    def encode_cursor(self, values) -> str:
+        payload = json.dumps([
+            self.ordering,
+            [value if isinstance(value, (int, float)) else str(value) for value in values],
+        ])
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str, model) -> list:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            ordering, raw_values = json.loads(urlsafe_b64decode(padded.encode()))
+            if ordering != self.ordering or len(raw_values) != len(ordering):
+                raise ValueError('Cursor does not match the ordering')
+            values = []
+            for field, raw in zip(ordering, raw_values):
+                model_field = self.get_field(model, field.lstrip('-'))
+                values.append(model_field.to_python(raw) if model_field else raw)
+            return values
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_values))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Keyset pagination cursor from the previous page "next" link.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class KeysetPaginationMixin:
+    """
+    Выбор пагинатора для ViewSet по запросу.
+
+    По умолчанию - постраничный из настроек REST_FRAMEWORK, а с
+    ?pagination=keyset, с курсором или с любым из keyset_query_params
+    (например, ?modified_since=) - KeysetPagination без COUNT(*),
+    у которой глубокие страницы не дороже первой.
+    """
+
+    keyset_query_params = ()
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = getattr(self.request, 'query_params', {})
+            if (
+                params.get('pagination') == 'keyset'
+                or KeysetPagination.cursor_query_param in params
+                or any(params.get(name) for name in self.keyset_query_params)
+            ):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+
+class KeysetListMixin:
+    """
+    Keyset-пагинация для ListView (HTML-страницы).
+
+    Страница выбирается по ?cursor= так же, как в KeysetPagination, размер -
+    paginate_by (или ?page_size=). В контексте шаблона есть ссылки
+    next_page_url и first_page_url (None, если ссылки нет), для них есть
+    шаблон shopapp/keyset-pagination.html.
+    """
+
+    paginate_by = 50
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPagination()
+        paginator.page_size = page_size
+        request = Request(self.request)
+        try:
+            page = paginator.paginate_queryset(queryset, request)
+        except NotFound:
+            raise Http404(paginator.invalid_cursor_message)
+
+        cursor = request.query_params.get(paginator.cursor_query_param)
+        self.next_page_url = paginator.get_next_link()
+        self.first_page_url = (
+            remove_query_param(self.request.build_absolute_uri(), paginator.cursor_query_param)
+            if cursor else None
+        )
+        return paginator, None, page, bool(self.next_page_url or cursor)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_page_url'] = getattr(self, 'next_page_url', None)
+        context['first_page_url'] = getattr(self, 'first_page_url', None)
+        return context
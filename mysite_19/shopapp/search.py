@@ -0,0 +1,173 @@
+"""
+Полнотекстовый поиск по товарам и статьям.
+
+На SQLite для модели заводится внешняя (external content) таблица FTS5
+``<db_table>_fts``, которую триггеры держат в синхронизации с основной
+таблицей, в том числе при bulk_create/bulk_update и queryset.update().
+На PostgreSQL в таблицу добавляется генерируемая колонка ``search_vector``
+с GIN-индексом. Результаты в обоих случаях сортируются по релевантности
+(bm25 / ts_rank). На остальных СУБД поиск откатывается к обычному icontains.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+FTS_VENDORS = ('sqlite', 'postgresql')
+SEARCH_VECTOR_COLUMN = 'search_vector'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_table(db_table: str) -> str:
+    return f'{db_table}_fts'
+
+
+def sqlite_fts_statements(db_table: str, columns) -> list:
+    """SQL создания FTS5-таблицы для db_table, триггеров синхронизации и первичного наполнения."""
+    fts = fts_table(db_table)
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5("
+        f"{column_list}, content='{db_table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {db_table} BEGIN "
+        f"INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {db_table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column_list} ON {db_table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts} (rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+
+def sqlite_drop_fts_statements(db_table: str) -> list:
+    fts = fts_table(db_table)
+    return [
+        f'DROP TRIGGER IF EXISTS {fts}_ai',
+        f'DROP TRIGGER IF EXISTS {fts}_ad',
+        f'DROP TRIGGER IF EXISTS {fts}_au',
+        f'DROP TABLE IF EXISTS {fts}',
+    ]
+
+
+def postgresql_fts_statements(db_table: str, columns) -> list:
+    document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return [
+        f"ALTER TABLE {db_table} ADD COLUMN {SEARCH_VECTOR_COLUMN} tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {document})) STORED",
+        f"CREATE INDEX {db_table}_search_vector_idx ON {db_table} USING GIN ({SEARCH_VECTOR_COLUMN})",
+    ]
+
+
+def postgresql_drop_fts_statements(db_table: str) -> list:
+    return [f'ALTER TABLE {db_table} DROP COLUMN IF EXISTS {SEARCH_VECTOR_COLUMN}']
+
+
+def create_fts_index(db_table: str, columns):
+    """Операция для migrations.RunPython: полнотекстовый индекс под текущую СУБД."""
+
+    def forwards(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            statements = sqlite_fts_statements(db_table, columns)
+        elif vendor == 'postgresql':
+            statements = postgresql_fts_statements(db_table, columns)
+        else:
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    def backwards(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            statements = sqlite_drop_fts_statements(db_table)
+        elif vendor == 'postgresql':
+            statements = postgresql_drop_fts_statements(db_table)
+        else:
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return forwards, backwards
+
+
+def search_terms(text: str) -> list:
+    return TERM_RE.findall(text)
+
+
+def sqlite_match_query(terms) -> str:
+    """Безопасный MATCH-запрос FTS5: каждое слово в кавычках, с поиском по префиксу."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def full_text_search(queryset: QuerySet, text: str, fields=()) -> QuerySet:
+    """
+    Отбор строк queryset, подходящих под text, с аннотацией search_rank.
+
+    Чем меньше search_rank, тем релевантнее строка, и queryset сразу
+    отсортирован по нему. Предполагается, что для модели создан индекс
+    через create_fts_index(). На СУБД без полнотекстового индекса каждое
+    слово ищется через icontains по fields.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+
+    if connection.vendor not in FTS_VENDORS:
+        for term in terms:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    db_table = queryset.model._meta.db_table
+    pk_column = queryset.model._meta.pk.column
+
+    if connection.vendor == 'sqlite':
+        # FTS5-таблица присоединяется один раз: MATCH выполняется однажды на
+        # весь запрос, а rank берётся из уже найденной строки (и в условии
+        # keyset-пагинации по search_rank тоже)
+        fts = fts_table(db_table)
+        queryset = queryset.extra(
+            tables=[fts],
+            where=[f'{fts} MATCH %s', f'{fts}.rowid = {db_table}.{pk_column}'],
+            params=[sqlite_match_query(terms)],
+        )
+        rank = RawSQL(f'{fts}.rank', ())
+    else:
+        tsquery = "to_tsquery('simple', %s)"
+        match = ' & '.join(f'{term}:*' for term in terms)
+        queryset = queryset.extra(
+            where=[f'{db_table}.{SEARCH_VECTOR_COLUMN} @@ {tsquery}'],
+            params=[match],
+        )
+        rank = RawSQL(f'-ts_rank({db_table}.{SEARCH_VECTOR_COLUMN}, {tsquery})', (match,))
+
+    return queryset.annotate(search_rank=rank).order_by('search_rank', 'pk')
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    SearchFilter, который ищет по полнотекстовому индексу и сортирует по релевантности.
+
+    Явная сортировка (?ordering=) от OrderingFilter, стоящего после этого
+    фильтра, перекрывает сортировку по релевантности. Если СУБД не
+    поддерживает полнотекстовый индекс, работает как обычный SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor not in FTS_VENDORS:
+            return super().filter_queryset(request, queryset, view)
+
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return full_text_search(queryset, ' '.join(terms))
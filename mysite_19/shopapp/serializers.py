@@ -1,11 +1,19 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Product
+from .fast_serializers import FastListSerializer
+from .models import Product, Order, OrderItem
+from .orders import check_order_relations, create_orders
+from .totals import refresh_order_totals
 
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
+        list_serializer_class = FastListSerializer
         fields = (
             'pk',
             'name',
@@ -15,4 +23,118 @@ class ProductSerializer(serializers.ModelSerializer):
             'has_additional_guarantee',
             'archived',
             'preview',
-        )
\ No newline at end of file
+            'updated_at',
+        )
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='product_id')
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    class Meta:
+        model = OrderItem
+        fields = (
+            'product',
+            'quantity',
+            'unit_price',
+        )
+        read_only_fields = ('unit_price',)
+
+
+class OrderListSerializer(serializers.ListSerializer):
+    """
+    Список заказов для массового создания.
+
+    Товары и пользователи всех заказов проверяются одним IN-запросом
+    на таблицу, а сохранение идёт через bulk_create.
+    """
+
+    def to_internal_value(self, data):
+        # ошибки возвращаются списком по заказам, как и ошибки полей
+        orders = super().to_internal_value(data)
+        errors = check_order_relations(orders)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return orders
+
+    def create(self, validated_data):
+        return create_orders(validated_data)
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    user = serializers.IntegerField(source='user_id', allow_null=True, required=False)
+    items = OrderItemSerializer(many=True)
+
+    class Meta:
+        model = Order
+        list_serializer_class = OrderListSerializer
+        fields = (
+            'pk',
+            'user',
+            'delivery_address',
+            'promocode',
+            'created_at',
+            'updated_at',
+            'total',
+            'items_count',
+            'items',
+        )
+
+    def validate(self, attrs):
+        # в составе OrderListSerializer связи проверяются для всех заказов разом
+        if not isinstance(self.parent, OrderListSerializer):
+            errors = check_order_relations([attrs])[0]
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        return create_orders([validated_data])[0]
+
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if items is not None:
+                instance.items.all().delete()
+                OrderItem.objects.bulk_create([OrderItem(order=instance, **item) for item in items])
+                instance.total, instance.items_count = refresh_order_totals([instance.pk])[instance.pk]
+        return instance
+
+
+class ReportPeriodSerializer(serializers.Serializer):
+    """Параметры отчёта: период [start, end] (по умолчанию последние 30 дней) и размер топа."""
+
+    DEFAULT_DAYS = 30
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+    order_by = serializers.ChoiceField(choices=['revenue', 'units'], required=False, default='revenue')
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=self.DEFAULT_DAYS - 1))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end')
+        return attrs
+
+
+class SalesTotalsSerializer(serializers.Serializer):
+    orders_count = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DailyRevenueSerializer(SalesTotalsSerializer):
+    day = serializers.DateField()
+
+
+class ProductSalesSerializer(SalesTotalsSerializer):
+    product = serializers.IntegerField(source='product_id')
+    name = serializers.CharField(source='product__name')
+
+
+class CustomerSalesSerializer(SalesTotalsSerializer):
+    user = serializers.IntegerField(source='user_id')
+    username = serializers.CharField(source='user__username')
@@ -0,0 +1,79 @@
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .caching import ORDERS, PRODUCTS, bump_generation
+from .models import Product, Order, OrderItem, ProductImage
+from .thumbnails import register_image_fields
+from .totals import refresh_order_totals
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_products_on_change(sender, **kwargs):
+    bump_generation(PRODUCTS)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_orders_on_change(sender, **kwargs):
+    bump_generation(ORDERS)
+
+
+@receiver(m2m_changed, sender=OrderItem)
+def invalidate_products_on_orders_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_generation(PRODUCTS)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_totals_on_item_change(sender, instance: OrderItem, raw=False, origin=None, **kwargs):
+    # при удалении самого заказа пересчитывать нечего
+    if raw or isinstance(origin, Order):
+        return
+    refresh_order_totals([instance.order_id])
+
+
+@receiver(m2m_changed, sender=OrderItem)
+def update_order_totals_on_orders_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Поддержка позиций и итогов при изменении order.products / product.orders.
+
+    add() создаёт позиции через bulk_create без цены, она заполняется
+    текущей ценой товара. Затем пересчитываются итоги затронутых заказов.
+    """
+    if action == 'pre_clear' and reverse:
+        instance._order_ids = list(instance.orders.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        if action == 'post_add' and pk_set:
+            (
+                OrderItem.objects
+                .filter(order_id=instance.pk, product_id__in=pk_set, unit_price__isnull=True)
+                .update(unit_price=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1]))
+            )
+        # держим экземпляр в актуальном состоянии, чтобы последующий save() не затёр итоги
+        instance.total, instance.items_count = refresh_order_totals([instance.pk])[instance.pk]
+        return
+
+    if action == 'post_clear':
+        order_ids = getattr(instance, '_order_ids', None)
+    else:
+        order_ids = pk_set
+    if not order_ids:
+        return
+    if action == 'post_add':
+        (
+            OrderItem.objects
+            .filter(product_id=instance.pk, order_id__in=order_ids, unit_price__isnull=True)
+            .update(unit_price=instance.price)
+        )
+    refresh_order_totals(order_ids)
+
+
+register_image_fields(Product, 'preview')
+register_image_fields(ProductImage, 'image')
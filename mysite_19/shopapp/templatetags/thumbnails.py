@@ -0,0 +1,27 @@
+from django import template
+from django.utils.html import format_html
+
+from ..thumbnails import get_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(file, sizes='100vw'):
+    """
+    Атрибуты src, srcset и sizes для <img> с уменьшенными копиями file.
+
+    sizes - ширина картинки на странице, например '300px': по ней браузер
+    выбирает из srcset копию с учётом плотности пикселей экрана.
+    """
+    thumbnails = get_thumbnails(file)
+    if not thumbnails:
+        return format_html('src="{}"', file.url) if file else ''
+    # src для браузеров без srcset - самая крупная копия, но не оригинал
+    src = thumbnails[-2][0] if len(thumbnails) > 1 else thumbnails[0][0]
+    return format_html(
+        'src="{}" srcset="{}" sizes="{}"',
+        src,
+        ', '.join(f'{url} {width}w' for url, width in thumbnails),
+        sizes,
+    )
@@ -1,13 +1,52 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 from string import ascii_letters
 from random import choices
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
+from asgiref.sync import async_to_sync
 from django.conf import settings
+from django.core import serializers
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
 from django.contrib.auth.models import User, Permission
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils import timezone, translation
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
 
-from .models import Product, Order
+from mysite_19.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware, QueryBudgetTestMixin, sql_pattern
+from mysite_19.sqlite_cache import SQLiteCache
+
+from .caching import TwoTierCache, exports_cache, get_or_build
+from .common import save_csv_products, save_csv_orders
+from .jobs import csv_import_job, run
+from .models import Product, Order, OrderItem, Job, ProductImage
+from .pagination import approximate_count
+from .rollups import refresh_rollups
+from .serializers import ProductSerializer
+from .thumbnails import get_thumbnails, thumbnail_name
 from .utils import add_two_numbers
+from .views import (GroupsListView, OrdersDetailView, OrdersListView, ProductDetailsView, ProductsListView,
+                    ProductViewSet, UserOrdersListView)
 
 
 class AddTwoNumbersTestCase(TestCase):
@@ -154,12 +193,15 @@ class ProductsExportViewTestCase(TestCase):
         'products-fixture.json',
     ]
 
+    def setUp(self) -> None:
+        translation.activate('en')
+
     def test_get_products_view(self):
         response = self.client.get(
             reverse('shopapp:products-export'),
         )
         self.assertEquals(response.status_code, 200)
-        products = Product.objects.order_by('pk').all()
+        products = Product.objects.filter(archived=False).order_by('pk').all()
         expected_data = [
             {
                 'pk': product.pk,
@@ -171,8 +213,1147 @@ class ProductsExportViewTestCase(TestCase):
             }
             for product in products
         ]
-        products_data = response.json()
+        products_data = json.loads(b''.join(response.streaming_content))
         self.assertEquals(
             products_data['products'],
             expected_data
         )
+
+    def test_filters_and_ndjson(self):
+        url = reverse('shopapp:products-export')
+        response = self.client.get(url, {'format': 'ndjson', 'archived': '', 'min_price': 1000})
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        expected = Product.objects.filter(price__gte=1000).order_by('pk')
+        self.assertEquals([json.loads(line)['pk'] for line in lines], [product.pk for product in expected])
+
+        response = self.client.get(url, {'min_price': 'cheap'})
+        self.assertEquals(response.status_code, 400)
+
+    def test_empty_catalogue(self):
+        Product.objects.all().delete()
+        response = self.client.get(reverse('shopapp:products-export'))
+        self.assertEquals(json.loads(b''.join(response.streaming_content)), {'products': []})
+
+    def test_gzip(self):
+        response = self.client.get(reverse('shopapp:products-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEquals(response['Content-Encoding'], 'gzip')
+        products_data = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEquals(len(products_data['products']), Product.objects.filter(archived=False).count())
+
+    def test_streams_under_asgi(self):
+        async def get():
+            response = await self.async_client.get(reverse('shopapp:products-export'), {'format': 'ndjson'})
+            return [chunk async for chunk in response.streaming_content]
+
+        chunks = async_to_sync(get)()
+        self.assertEquals(len(b''.join(chunks).splitlines()), Product.objects.filter(archived=False).count())
+
+
+class ProductDownloadCSVViewTestCase(TestCase):
+    fixtures = [
+        'users-fixture.json',
+        'products-fixture.json',
+    ]
+
+    def setUp(self) -> None:
+        translation.activate('en')
+
+    def test_download_csv_streams_filtered_products(self):
+        response = self.client.get(
+            reverse('shopapp:product-download-csv'),
+            {'archived': False, 'ordering': 'price'},
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        content = b''.join(response.streaming_content).decode()
+        expected_rows = ['name,price,quantity'] + [
+            f'{product.name},{product.price},{product.quantity}'
+            for product in Product.objects.filter(archived=False).order_by('price')
+        ]
+        self.assertEquals(content.splitlines(), expected_rows)
+
+
+class CSVImportTestCase(TestCase):
+    def test_import_products_reports_bad_rows(self):
+        data = (
+            'name,description,price,quantity\n'
+            'Samsung,Simple phone,444.44,44\n'
+            'iPhone14,Big display,not-a-price,55\n'
+            'Nokia,,99,-1\n'
+            'Xiaomi,Cheap phone,199.99,\n'
+        ).encode()
+
+        result = save_csv_products(BytesIO(data), encoding='utf-8', batch_size=2)
+
+        self.assertEquals(result.rows, 4)
+        self.assertEquals(result.created, 2)
+        self.assertEquals([error['line'] for error in result.errors], [3, 4])
+        self.assertIn('price', result.errors[0]['error'])
+        self.assertIn('quantity', result.errors[1]['error'])
+        self.assertEquals(
+            list(Product.objects.order_by('name').values_list('name', 'quantity')),
+            [('Samsung', 44), ('Xiaomi', 0)],
+        )
+
+    def test_import_orders_checks_users_exist(self):
+        user = User.objects.create(username='buyer')
+        data = (
+            'delivery_address,promocode,user_id\n'
+            f'"Omsk, Lenina 1",PROMO1,{user.pk}\n'
+            f'"Tomsk, Mira 2",PROMO2,{user.pk + 100}\n'
+        ).encode()
+
+        result = save_csv_orders(BytesIO(data), encoding='utf-8')
+
+        self.assertEquals(result.created, 1)
+        self.assertEquals(result.errors[0]['line'], 3)
+        self.assertTrue(Order.objects.filter(promocode='PROMO1', user=user).exists())
+
+    def test_upsert_products_by_name(self):
+        Product.objects.create(name='Samsung', description='Simple phone', price=100, quantity=1)
+        Product.objects.create(name='iPhone14', description='Big display', price=500, quantity=5)
+        data = (
+            'name,description,price,quantity\n'
+            'Samsung,Simple phone,100.00,1\n'
+            'iPhone14,Big display,450,5\n'
+            'Nokia,Old phone,50,3\n'
+        ).encode()
+
+        result = save_csv_products(BytesIO(data), encoding='utf-8', upsert_key='name')
+
+        self.assertEquals((result.created, result.updated, result.unchanged), (1, 1, 1))
+        self.assertEquals(Product.objects.count(), 3)
+        self.assertEquals(Product.objects.get(name='iPhone14').price, 450)
+
+    def test_import_rejects_unknown_columns(self):
+        data = 'name,colour\nSamsung,black\n'.encode()
+
+        result = save_csv_products(BytesIO(data), encoding='utf-8')
+
+        self.assertEquals(result.created, 0)
+        self.assertIn('colour', result.errors[0]['error'])
+
+
+class BackgroundJobsTestCase(TestCase):
+    fixtures = [
+        'users-fixture.json',
+        'products-fixture.json',
+    ]
+
+    def setUp(self) -> None:
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        private_root = TemporaryDirectory()
+        self.addCleanup(private_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(
+            SHOP_JOBS_EAGER=True,
+            MEDIA_ROOT=media_root.name,
+            PRIVATE_MEDIA_ROOT=private_root.name,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        translation.activate('en')
+        self.user = User.objects.create_user(username='jobs-owner', password='password')
+        self.client.force_login(self.user)
+
+    def test_export_products_in_background(self):
+        response = self.client.get(
+            reverse('shopapp:product-download-csv'),
+            {'background': 1, 'archived': False},
+        )
+        self.assertEquals(response.status_code, 202)
+
+        status = self.client.get(response['Location']).json()
+        self.assertEquals(status['status'], Job.Status.DONE)
+        expected_rows = Product.objects.filter(archived=False).count()
+        self.assertEquals(status['progress'], expected_rows)
+        self.assertEquals(status['total'], expected_rows)
+
+        download = self.client.get(status['download_url'])
+        self.assertEquals(download.status_code, 200)
+        self.assertEquals(len(b''.join(download.streaming_content).decode().splitlines()), expected_rows + 1)
+        # файл выгрузки не лежит в раздаваемом nginx MEDIA_ROOT
+        self.assertEquals(os.listdir(self.media_root), [])
+
+    def test_job_is_visible_only_to_its_author_and_staff(self):
+        job = Job.objects.create(kind='export_products', created_by=self.user)
+        status_url = reverse('shopapp:job_status', kwargs={'pk': job.pk})
+        download_url = reverse('shopapp:job_download', kwargs={'pk': job.pk})
+        self.assertEquals(self.client.get(status_url).status_code, 200)
+
+        self.client.force_login(User.objects.create_user(username='stranger', password='password'))
+        self.assertEquals(self.client.get(status_url).status_code, 404)
+        self.assertEquals(self.client.get(download_url).status_code, 404)
+
+        self.client.force_login(User.objects.create_user(username='staff', password='password', is_staff=True))
+        self.assertEquals(self.client.get(status_url).status_code, 200)
+
+        self.client.logout()
+        self.assertEquals(self.client.get(status_url).status_code, 302)
+
+    def test_failed_import_deletes_source_file(self):
+        def broken_import(file, **kwargs):
+            raise ValueError('broken CSV')
+
+        job = Job(kind='import_products', created_by=self.user)
+        job.source_file.save('devices.csv', ContentFile(b'name\nSamsung\n'), save=False)
+        job.save()
+        source_name = job.source_file.name
+
+        run(job.pk, csv_import_job(broken_import), 'utf-8', {})
+
+        job.refresh_from_db()
+        self.assertEquals((job.status, job.error), (Job.Status.FAILED, 'broken CSV'))
+        self.assertFalse(job.source_file.storage.exists(source_name))
+
+    def test_import_products_in_background(self):
+        csv_file = SimpleUploadedFile(
+            'devices.csv',
+            b'name,description,price,quantity\nSamsung,Simple phone,444,44\n',
+            content_type='text/csv',
+        )
+        response = self.client.post(
+            reverse('shopapp:product-upload-csv') + '?background=1',
+            {'file': csv_file},
+        )
+        self.assertEquals(response.status_code, 202)
+
+        status = response.json()
+        self.assertEquals(status['status'], Job.Status.DONE)
+        self.assertEquals(status['result']['created'], 1)
+        self.assertTrue(Product.objects.filter(name='Samsung').exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductListCacheTestCase(TestCase):
+    fixtures = [
+        'users-fixture.json',
+        'products-fixture.json',
+    ]
+
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.url = reverse('shopapp:product-list')
+
+    def test_list_is_invalidated_on_product_change(self):
+        response = self.client.get(self.url, {'archived': False, 'ordering': 'price'})
+        count = response.json()['count']
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url, {'ordering': 'price', 'search': '', 'archived': False})
+        self.assertEquals(cached.json()['count'], count)
+
+        Product.objects.create(name='Brand new product')
+        response = self.client.get(self.url, {'archived': False, 'ordering': 'price'})
+        self.assertEquals(response.json()['count'], count + 1)
+
+
+class SQLiteCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = SQLiteCache(f'{tmp.name}/cache.sqlite3', {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+
+    def test_get_set_add_incr(self):
+        self.cache.set('key', {'a': 1})
+        self.assertEquals(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertEquals(self.cache.incr('counter', 5), 6)
+        self.cache.set('expired', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 'again'))
+        self.assertEquals(self.cache.get_many(['key', 'counter', 'missing']), {'key': {'a': 1}, 'counter': 6})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for i in range(10):
+            self.cache.set(f'key{i}', i)
+        self.cache._db.execute("UPDATE cache SET accessed = 0 WHERE key NOT LIKE '%key0'")
+
+        self.cache.set('key10', 10)
+        self.cache.cull()
+
+        self.assertEquals(self.cache.get('key0'), 0)
+        self.assertEquals(self.cache.get('key10'), 10)
+        self.assertEquals(sum(self.cache.has_key(f'key{i}') for i in range(11)), 5)
+
+
+class TwoTierCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        self.backend = LocMemCache('two-tier-tests', {})
+        self.backend.clear()
+        self.cache = TwoTierCache('tests', maxsize=2, backend=self.backend)
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        time.sleep(0.1)
+        return ['value']
+
+    def test_concurrent_misses_build_once(self):
+        threads = [
+            threading.Thread(target=self.cache.get_or_set, args=('key', self.build, 60))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(self.builds, 1)
+        stats = self.cache.get_stats()
+        self.assertEquals(stats['builds'], 1)
+        self.assertEquals(stats['local_hits'], 7)
+
+    def test_shared_tier_is_used_after_local_eviction(self):
+        self.cache.get_or_set('a', self.build, 60)
+        self.cache.get_or_set('b', self.build, 60)
+        self.cache.get_or_set('c', self.build, 60)
+
+        self.assertEquals(self.cache.get('a'), ['value'])
+        self.assertEquals(self.builds, 3)
+        self.assertEquals(self.cache.get_stats()['shared_hits'], 1)
+
+    def test_async_concurrent_misses_build_once(self):
+        async def build():
+            self.builds += 1
+            await asyncio.sleep(0.1)
+            return ['value']
+
+        async def run():
+            return await asyncio.gather(*(self.cache.aget_or_set('key', build, 60) for _ in range(8)))
+
+        self.assertEquals(async_to_sync(run)(), [['value']] * 8)
+        self.assertEquals(self.builds, 1)
+        self.assertEquals(async_to_sync(self.cache.aget_or_set)('key', build, 60), ['value'])
+        self.assertEquals(self.cache.get_stats()['local_hits'], 1)
+
+
+class GetOrBuildTestCase(TestCase):
+    def setUp(self) -> None:
+        self.backend = LocMemCache('get-or-build-tests', {})
+        self.backend.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        time.sleep(0.1)
+        return self.builds
+
+    def test_concurrent_misses_wait_for_single_build(self):
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_build('key', self.build, 60, backend=self.backend))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(self.builds, 1)
+        self.assertEquals(results, [1] * 5)
+
+    def test_value_is_rebuilt_early_before_expiry(self):
+        get_or_build('key', self.build, 60, backend=self.backend)
+        self.assertEquals(get_or_build('key', self.build, 60, backend=self.backend), 1)
+
+        # при очень большом beta ранняя перестройка срабатывает сразу
+        self.assertEquals(get_or_build('key', self.build, 60, beta=1e9, backend=self.backend), 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductKeysetPaginationTestCase(TestCase):
+    fixtures = [
+        'users-fixture.json',
+        'products-fixture.json',
+    ]
+
+    def setUp(self) -> None:
+        translation.activate('en')
+
+    def test_walk_all_pages(self):
+        Product.objects.create(name='Same price 1', price=999)
+        Product.objects.create(name='Same price 2', price=999)
+        url = reverse('shopapp:product-list') + '?pagination=keyset&ordering=-price&page_size=3'
+
+        received = []
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            received.extend(product['pk'] for product in data['results'])
+            url = data['next']
+
+        expected = list(Product.objects.order_by('-price', 'pk').values_list('pk', flat=True))
+        self.assertEquals(received, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('shopapp:product-list'), {'cursor': 'garbage'})
+        self.assertEquals(response.status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductFullTextSearchTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.url = reverse('shopapp:product-list')
+        self.best = Product.objects.create(name='Keyboard', description='Mechanical keyboard, keyboard for gamers')
+        self.other = Product.objects.create(name='Mouse', description='Works with any keyboard')
+        Product.objects.create(name='Monitor', description='Big screen')
+
+    def search(self, text, **params):
+        response = self.client.get(self.url, {'search': text, **params})
+        return [product['name'] for product in response.json()['results']]
+
+    def test_results_ranked_by_relevance(self):
+        self.assertEquals(self.search('keyboard'), ['Keyboard', 'Mouse'])
+
+    def test_prefix_match(self):
+        self.assertEquals(self.search('mon'), ['Monitor'])
+
+    def test_explicit_ordering_overrides_rank(self):
+        self.assertEquals(self.search('keyboard', ordering='-name'), ['Mouse', 'Keyboard'])
+
+    def test_index_follows_updates_and_deletes(self):
+        Product.objects.filter(pk=self.other.pk).update(description='Wireless')
+        self.best.delete()
+        self.assertEquals(self.search('keyboard'), [])
+        self.assertEquals(self.search('wireless'), ['Mouse'])
+
+    def test_keyset_pagination_by_rank(self):
+        data = self.client.get(self.url, {'search': 'keyboard', 'pagination': 'keyset', 'page_size': 1}).json()
+        self.assertEquals([product['name'] for product in data['results']], ['Keyboard'])
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(data['next']).json()
+        self.assertEquals([product['name'] for product in data['results']], ['Mouse'])
+        self.assertIsNone(data['next'])
+        # FTS-таблица присоединена один раз, в том числе для условия по search_rank
+        search_sql = [query['sql'] for query in queries.captured_queries if 'MATCH' in query['sql']]
+        self.assertEquals([sql.count('MATCH') for sql in search_sql], [1])
+
+
+class OrderTotalsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.cheap = Product.objects.create(name='Cheap', price=Decimal('10.50'))
+        self.expensive = Product.objects.create(name='Expensive', price=Decimal('100'))
+        self.order = Order.objects.create(delivery_address='Street')
+
+    def assertTotals(self, order, total, items_count):
+        order.refresh_from_db()
+        self.assertEquals((order.total, order.items_count), (Decimal(total), items_count))
+
+    def test_add_remove_clear(self):
+        self.order.products.add(self.cheap, self.expensive)
+        self.order.products.add(self.cheap)
+        self.assertEquals(self.order.total, Decimal('110.50'))
+        self.assertTotals(self.order, '110.50', 2)
+
+        self.order.products.remove(self.expensive)
+        self.assertTotals(self.order, '10.50', 1)
+
+        self.order.products.clear()
+        self.assertTotals(self.order, '0', 0)
+
+    def test_save_after_add_keeps_totals(self):
+        self.order.products.add(self.cheap)
+        self.order.promocode = 'promo'
+        self.order.save()
+        self.assertTotals(self.order, '10.50', 1)
+
+    def test_reverse_side(self):
+        other = Order.objects.create(delivery_address='Avenue')
+        self.expensive.orders.add(self.order, other)
+        self.assertTotals(other, '100', 1)
+
+        self.expensive.orders.remove(other)
+        self.assertTotals(other, '0', 0)
+
+        self.expensive.orders.clear()
+        self.assertTotals(self.order, '0', 0)
+
+    def test_price_is_captured_at_purchase(self):
+        self.order.products.add(self.cheap, self.expensive)
+
+        self.expensive.price = Decimal('90')
+        self.expensive.save()
+        save_csv_products(BytesIO(b'name,price\nCheap,20\n'), 'utf-8', upsert_key='name')
+        self.assertTotals(self.order, '110.50', 2)
+        self.assertEquals(self.order.items.get(product=self.cheap).unit_price, Decimal('10.50'))
+
+        self.cheap.delete()
+        self.assertTotals(self.order, '100', 1)
+
+    def test_quantity(self):
+        self.order.products.add(self.cheap, through_defaults={'quantity': 3})
+        self.assertTotals(self.order, '31.50', 3)
+
+        item = OrderItem.objects.create(order=self.order, product=self.expensive, quantity=2)
+        self.assertEquals(item.unit_price, Decimal('100'))
+        self.assertTotals(self.order, '231.50', 5)
+
+        item.quantity = 1
+        item.save()
+        self.assertTotals(self.order, '131.50', 4)
+
+    def test_order_totals_command(self):
+        self.order.products.add(self.cheap, self.expensive)
+        OrderItem.objects.filter(product=self.cheap).update(quantity=2)
+
+        with self.assertRaises(CommandError):
+            call_command('order_totals', '--check', stdout=StringIO())
+        call_command('order_totals', stdout=StringIO())
+        self.assertTotals(self.order, '121', 3)
+        call_command('order_totals', '--check', stdout=StringIO())
+
+
+class OrderItemsViewsTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.user = User.objects.create_superuser(username='items-admin', password='password')
+        self.client.force_login(self.user)
+        products = [Product.objects.create(name=f'Product {i}', price=i) for i in range(1, 4)]
+        for i in range(3):
+            order = Order.objects.create(delivery_address=f'Street {i}', user=self.user)
+            order.products.add(*products, through_defaults={'quantity': 2})
+
+    def test_orders_list_queries(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('shopapp:order_list'))
+        self.assertContains(response, 'Product 3: 2 x $3.00', count=3)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_user_orders_json(self):
+        exports_cache.clear_local()
+        response = self.client.get(reverse('shopapp:order_user_json', kwargs={'pk': self.user.pk}))
+        orders = response.json()
+        self.assertEquals(len(orders), 3)
+        self.assertEquals(orders[0]['model'], 'shopapp.order')
+        self.assertEquals(len(orders[0]['fields']['products']), 3)
+        self.assertEquals(orders[0]['fields']['items'][0], {'product': orders[0]['fields']['products'][0],
+                                                            'quantity': 2, 'unit_price': '1.00'})
+        self.assertEquals(orders[0]['fields']['total'], '12.00')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_user_orders_json_matches_django_serializer(self):
+        exports_cache.clear_local()
+        Order.objects.create(user=self.user, receipt='orders/receipts/receipt.pdf')
+        orders = list(Order.objects.filter(user=self.user).prefetch_related('items').order_by('pk'))
+        expected = serializers.serialize('python', orders)
+        for order, serialized in zip(orders, expected):
+            items = sorted(order.items.all(), key=lambda item: item.pk)
+            serialized['fields']['products'] = [item.product_id for item in items]
+            serialized['fields']['items'] = [
+                {'product': item.product_id, 'quantity': item.quantity, 'unit_price': item.unit_price}
+                for item in items
+            ]
+
+        # пользователь, заказы и позиции - без запроса на каждый заказ
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('shopapp:order_user_json', kwargs={'pk': self.user.pk}))
+        self.assertEquals(response.content.decode(), json.dumps(expected, cls=DjangoJSONEncoder))
+
+    def test_user_orders_json_unknown_user(self):
+        response = self.client.get(reverse('shopapp:order_user_json', kwargs={'pk': 0}))
+        self.assertEquals(response.status_code, 404)
+
+
+class SalesRollupsTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.admin = User.objects.create_superuser(username='reports-admin', password='password')
+        self.buyer = User.objects.create_user(username='buyer', password='password')
+        self.phone = Product.objects.create(name='Phone', price=100)
+        self.case = Product.objects.create(name='Case', price=10)
+        self.today = timezone.localdate()
+
+        self.create_order(self.buyer, {self.phone: 1, self.case: 2}, days_ago=2)
+        self.create_order(self.admin, {self.case: 5}, days_ago=2)
+        self.create_order(None, {self.phone: 2}, days_ago=400)
+        refresh_rollups()
+        self.client.force_login(self.admin)
+
+    def create_order(self, user, quantities, days_ago=0):
+        order = Order.objects.create(user=user, delivery_address='Street')
+        for product, quantity in quantities.items():
+            order.products.add(product, through_defaults={'quantity': quantity})
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def report(self, name, **params):
+        response = self.client.get(reverse(f'shopapp:report-{name}'), params)
+        self.assertEquals(response.status_code, 200)
+        return response.json()
+
+    def test_daily_revenue(self):
+        with self.assertNumQueries(3):
+            data = self.report('revenue')
+        self.assertEquals(data, [{
+            'day': str(self.today - timedelta(days=2)),
+            'orders_count': 2,
+            'units': 8,
+            'revenue': '170.00',
+        }])
+
+        start = str(self.today - timedelta(days=500))
+        self.assertEquals(len(self.report('revenue', start=start)), 2)
+
+    def test_top_products_and_customers(self):
+        products = self.report('products', order_by='units')
+        self.assertEquals([row['name'] for row in products], ['Case', 'Phone'])
+        self.assertEquals(products[0]['units'], 7)
+
+        customers = self.report('customers', limit=1)
+        self.assertEquals(customers, [{
+            'user': self.buyer.pk,
+            'username': 'buyer',
+            'orders_count': 1,
+            'units': 3,
+            'revenue': '120.00',
+        }])
+
+    def test_incremental_refresh(self):
+        self.create_order(self.buyer, {self.phone: 1})
+        # старые дни не пересчитываются: правка задним числом видна только после --since
+        OrderItem.objects.filter(order__created_at__lt=timezone.now() - timedelta(days=300)).update(quantity=3)
+        refresh_rollups()
+
+        revenue = self.report('revenue', start=str(self.today - timedelta(days=500)))
+        self.assertEquals([row['revenue'] for row in revenue], ['200.00', '170.00', '100.00'])
+
+        call_command('refresh_rollups', '--since', str(self.today - timedelta(days=500)), stdout=StringIO())
+        revenue = self.report('revenue', start=str(self.today - timedelta(days=500)))
+        self.assertEquals(revenue[0]['revenue'], '300.00')
+
+    def test_staff_only(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse('shopapp:report-revenue'))
+        self.assertEquals(response.status_code, 403)
+
+    def test_invalid_period(self):
+        response = self.client.get(reverse('shopapp:report-revenue'), {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEquals(response.status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class OrderViewSetTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.user = User.objects.create_user(username='orders-api', password='password')
+        self.user.user_permissions.add(*Permission.objects.filter(codename__in=['add_order', 'change_order']))
+        self.client.force_login(self.user)
+        self.products = [Product.objects.create(name=f'Product {i}', price=i * 10) for i in range(1, 4)]
+
+    def payload(self, count):
+        return [
+            {
+                'user': self.user.pk,
+                'delivery_address': f'Street {i}',
+                'items': [
+                    {'product': self.products[0].pk, 'quantity': 2},
+                    {'product': self.products[i % 2 + 1].pk},
+                ],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_constant_queries(self):
+        url = reverse('shopapp:order-bulk-create')
+        self.client.post(url, self.payload(1), content_type='application/json')
+
+        # сессия, пользователь, 2 запроса прав, товары, пользователи заказов, 2 вставки и savepoint
+        with self.assertNumQueries(10):
+            response = self.client.post(url, self.payload(50), content_type='application/json')
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(response.json()['created'], 50)
+
+        order = Order.objects.get(pk=response.json()['ids'][1])
+        self.assertEquals((order.total, order.items_count), (Decimal('50'), 3))
+        self.assertEquals(
+            list(order.items.order_by('product_id').values_list('quantity', 'unit_price')),
+            [(2, Decimal('10')), (1, Decimal('30'))],
+        )
+
+    def test_bulk_create_is_all_or_nothing(self):
+        payload = self.payload(3)
+        payload[1]['items'].append({'product': 0})
+        payload[2]['items'].append({'product': self.products[0].pk})
+
+        response = self.client.post(reverse('shopapp:order-bulk-create'), payload, content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+        errors = response.json()
+        self.assertEquals(errors[0], {})
+        self.assertIn('product', errors[1]['items'][2])
+        self.assertIn('product', errors[2]['items'][2])
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_and_update(self):
+        response = self.client.post(
+            reverse('shopapp:order-list'), self.payload(1)[0], content_type='application/json',
+        )
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(response.json()['total'], '40.00')
+
+        url = reverse('shopapp:order-detail', kwargs={'pk': response.json()['pk']})
+        response = self.client.patch(
+            url, {'items': [{'product': self.products[2].pk, 'quantity': 3}]}, content_type='application/json',
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['total'], '90.00')
+        self.assertEquals(response.json()['items'], [{'product': self.products[2].pk, 'quantity': 3,
+                                                      'unit_price': '30.00'}])
+
+    def test_partial_update_without_items(self):
+        response = self.client.post(
+            reverse('shopapp:order-list'), self.payload(1)[0], content_type='application/json',
+        )
+        url = reverse('shopapp:order-detail', kwargs={'pk': response.json()['pk']})
+
+        response = self.client.patch(url, {'promocode': 'B'}, content_type='application/json')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['promocode'], 'B')
+        self.assertEquals(response.json()['total'], '40.00')
+        self.assertEquals(len(response.json()['items']), 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConditionalGetTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        exports_cache.clear_local()
+        self.user = User.objects.create_user(username='etag-user', password='password')
+        self.product = Product.objects.create(name='Phone', price=100)
+        order = Order.objects.create(user=self.user)
+        order.products.add(self.product)
+
+    def assertNotModified(self, url, queries=0):
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(queries):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(not_modified.status_code, 304)
+        self.assertEquals(not_modified['ETag'], response['ETag'])
+        return response
+
+    def test_products_api(self):
+        self.assertNotModified(reverse('shopapp:product-list'))
+        self.assertNotModified(reverse('shopapp:product-detail', kwargs={'pk': self.product.pk}))
+
+    def test_products_export(self):
+        url = reverse('shopapp:products-export')
+        response = self.assertNotModified(url)
+
+        self.product.name = 'Smartphone'
+        self.product.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(changed.status_code, 200)
+        self.assertNotEquals(changed['ETag'], response['ETag'])
+        self.assertEquals(json.loads(b''.join(changed.streaming_content))['products'][0]['name'], 'Smartphone')
+
+    def test_products_export_validators_depend_on_query(self):
+        url = reverse('shopapp:products-export')
+        json_response = self.assertNotModified(url)
+        ndjson = self.assertNotModified(url + '?format=ndjson')
+        filtered = self.assertNotModified(url + '?format=ndjson&min_price=1000')
+        self.assertEquals(len({json_response['ETag'], ndjson['ETag'], filtered['ETag']}), 3)
+
+        response = self.client.get(url + '?format=ndjson', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+
+    def test_user_orders_json(self):
+        url = reverse('shopapp:order_user_json', kwargs={'pk': self.user.pk})
+        response = self.assertNotModified(url, queries=1)
+
+        Order.objects.create(user=self.user)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(changed.status_code, 200)
+        self.assertEquals(len(changed.json()), 2)
+
+    def test_validators_depend_on_language(self):
+        url = reverse('shopapp:products-export')
+        english = self.client.get(url)
+        translation.activate('ru')
+        russian = self.client.get(reverse('shopapp:products-export'))
+        self.assertNotEquals(english['ETag'], russian['ETag'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ModifiedSinceTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.since = timezone.now() - timedelta(hours=1)
+        self.products = [Product.objects.create(name=f'Product {i}', price=i) for i in range(6)]
+        Product.objects.filter(pk__in=[product.pk for product in self.products[:2]]).update(
+            updated_at=self.since - timedelta(days=1),
+        )
+        # одинаковый updated_at у нескольких товаров не должен терять строки между страницами
+        Product.objects.filter(pk__in=[product.pk for product in self.products[2:5]]).update(updated_at=self.since)
+
+    def test_walk_changed_products(self):
+        url = reverse('shopapp:product-list') + '?' + urlencode(
+            {'modified_since': self.since.isoformat(), 'page_size': 2}
+        )
+        received = []
+        while url:
+            data = self.client.get(url).json()
+            received.extend(product['pk'] for product in data['results'])
+            url = data['next']
+        self.assertEquals(received, [product.pk for product in self.products[2:]])
+
+    def test_save_and_bulk_paths_touch_updated_at(self):
+        product = self.products[0]
+        before = Product.objects.get(pk=product.pk).updated_at
+
+        save_csv_products(BytesIO(f'name,price\n{product.name},42\n'.encode()), encoding='utf-8', upsert_key='name')
+        self.assertGreater(Product.objects.get(pk=product.pk).updated_at, before)
+
+        order = Order.objects.create()
+        Order.objects.filter(pk=order.pk).update(updated_at=self.since)
+        order.products.add(product)
+        self.assertGreater(Order.objects.get(pk=order.pk).updated_at, self.since)
+
+    def test_changed_orders(self):
+        user = User.objects.create_user(username='sync', password='password')
+        user.user_permissions.add(Permission.objects.get(codename='view_order'))
+        self.client.force_login(user)
+        old, new = Order.objects.create(), Order.objects.create()
+        Order.objects.filter(pk=old.pk).update(updated_at=self.since - timedelta(days=1))
+
+        data = self.client.get(reverse('shopapp:order-list'), {'modified_since': self.since.isoformat()}).json()
+        self.assertEquals([order['pk'] for order in data['results']], [new.pk])
+
+    def test_invalid_modified_since(self):
+        response = self.client.get(reverse('shopapp:product-list'), {'modified_since': 'yesterday'})
+        self.assertEquals(response.status_code, 400)
+        self.assertIn('modified_since', response.json())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FastProductSerializerTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.user = User.objects.create_user(username='fast', password='password')
+        for i in range(12):
+            Product.objects.create(
+                name=f'Product "{i}" — тест',
+                description='Line\nbreak  ' if i % 2 else '',
+                price=Decimal('10.5') * i,
+                archived=i % 3 == 0,
+                created_by=self.user if i % 4 else None,
+            )
+        Product.objects.filter(name__startswith='Product "1"').update(preview='products/preview/1 a.jpg')
+
+    def assertSameAsModelSerializer(self, response, queryset):
+        context = {'request': response.wsgi_request}
+        # список экземпляров моделей FastListSerializer сериализует обычным путём
+        expected = ProductSerializer(list(queryset), many=True, context=context).data
+        self.assertEquals(response.content, JSONRenderer().render({**response.data, 'results': expected}))
+
+    def test_page_is_byte_identical(self):
+        response = self.client.get(reverse('shopapp:product-list'))
+        self.assertEquals(len(response.data['results']), 10)
+        self.assertIn('http://testserver/', response.content.decode())
+        self.assertSameAsModelSerializer(response, Product.objects.all()[:10])
+
+    def test_keyset_page_is_byte_identical(self):
+        response = self.client.get(reverse('shopapp:product-list'), {'pagination': 'keyset', 'ordering': '-price'})
+        self.assertSameAsModelSerializer(response, Product.objects.order_by('-price', 'pk')[:10])
+        next_page = self.client.get(response.data['next'])
+        self.assertSameAsModelSerializer(next_page, Product.objects.order_by('-price', 'pk')[10:])
+
+    def test_queryset_without_pagination(self):
+        queryset = Product.objects.order_by('pk')
+        fast = JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+        slow = JSONRenderer().render(ProductSerializer(list(queryset), many=True).data)
+        self.assertEquals(fast, slow)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.user = User.objects.create_user(username='budget', password='password')
+        self.user.user_permissions.add(
+            *Permission.objects.filter(codename__in=['view_order', 'add_product', 'change_product'])
+        )
+        self.client.force_login(self.user)
+        self.products = [Product.objects.create(name=f'Product {i}', price=i) for i in range(3)]
+        self.add_orders(1)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user=self.user, delivery_address='Street')
+            order.products.add(*self.products)
+            ProductImage.objects.create(product=self.products[0], image='products/images/image.jpg')
+
+    def urls(self):
+        order = Order.objects.first()
+        return [
+            (reverse('shopapp:groups'), GroupsListView.query_budget),
+            (reverse('shopapp:products_list'), ProductsListView.query_budget),
+            (reverse('shopapp:product_detail', kwargs={'pk': self.products[0].pk}), ProductDetailsView.query_budget),
+            (reverse('shopapp:order_list'), OrdersListView.query_budget),
+            (reverse('shopapp:order_detail', kwargs={'pk': order.pk}), OrdersDetailView.query_budget),
+            (reverse('shopapp:order_user_list', kwargs={'pk': self.user.pk}), UserOrdersListView.query_budget),
+        ]
+
+    def count_queries(self):
+        counts = {}
+        for url, budget in self.urls():
+            with self.assertQueryBudget(budget, duplicates=2) as recorder:
+                self.assertEquals(self.client.get(url).status_code, 200)
+            counts[url] = recorder.count
+        return counts
+
+    def test_views_run_constant_number_of_queries(self):
+        few = self.count_queries()
+        self.add_orders(10)
+        self.assertEquals(self.count_queries(), few)
+
+    def test_duplicated_queries_are_reported(self):
+        self.add_orders(2)
+        with self.assertRaisesMessage(AssertionError, '3 x SELECT'):
+            with self.assertQueryBudget(10, duplicates=3):
+                for order in Order.objects.all():
+                    order.user.username
+
+    @override_settings(QUERY_BUDGET=1, QUERY_BUDGET_STRICT=True)
+    def test_middleware_enforces_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'query budget 1 exceeded'):
+            self.client.get(reverse('shopapp:order_create'))
+        # собственный бюджет представления важнее QUERY_BUDGET
+        self.assertEquals(self.client.get(reverse('shopapp:order_list')).status_code, 200)
+
+    @override_settings(QUERY_BUDGET=None, QUERY_BUDGET_DUPLICATES=None)
+    def test_middleware_can_be_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(lambda request: None)
+
+    def test_sql_pattern(self):
+        self.assertEquals(
+            sql_pattern("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class KeysetListViewsTestCase(TestCase):
+    def setUp(self) -> None:
+        translation.activate('en')
+        self.user = User.objects.create_superuser(username='pages-admin', password='password')
+        self.client.force_login(self.user)
+        self.products = [
+            Product.objects.create(name=f'Product {i % 4}', price=i, description='Long description')
+            for i in range(9)
+        ]
+
+    def walk(self, url, **params):
+        received = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEquals(response.status_code, 200)
+            received.extend(response.context['object_list'])
+            if not response.context['next_page_url']:
+                return received, response
+            response = self.client.get(response.context['next_page_url'])
+
+    def test_products_pages(self):
+        received, last_page = self.walk(reverse('shopapp:products_list'), page_size=4)
+        self.assertEquals([product.pk for product in received], [product.pk for product in Product.objects.all()])
+        self.assertIn('description', received[0].get_deferred_fields())
+        self.assertIsNotNone(last_page.context['first_page_url'])
+        self.assertContains(last_page, 'There are 9 products.')
+
+    @patch('shopapp.pagination.APPROXIMATE_COUNT_LIMIT', 5)
+    def test_approximate_count(self):
+        self.assertEquals(approximate_count(Product.objects.all()), (5, False))
+        self.assertEquals(approximate_count(Product.objects.filter(price__lt=3)), (3, True))
+        response = self.client.get(reverse('shopapp:products_list'))
+        self.assertContains(response, 'There are more than 5 products.')
+
+    def test_orders_pages(self):
+        orders = [Order.objects.create(user=self.user, delivery_address=f'Street {i}') for i in range(5)]
+        received, _ = self.walk(reverse('shopapp:order_list'), page_size=2)
+        self.assertEquals(received, orders)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('shopapp:products_list'), {'cursor': 'broken'})
+        self.assertEquals(response.status_code, 404)
+
+
+class ThumbnailsTestCase(TestCase):
+    def setUp(self) -> None:
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            SHOP_JOBS_EAGER=True,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.product = Product.objects.create(name='Camera')
+
+    @staticmethod
+    def image_file(name, size, mode='RGB', image_format='JPEG'):
+        buffer = BytesIO()
+        Image.new(mode, size, (255, 0, 0, 128)[:len(mode)]).save(buffer, format=image_format)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_thumbnails_are_created_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(
+                product=self.product,
+                image=self.image_file('photo.png', (800, 400), 'RGBA', 'PNG'),
+            )
+
+        storage = image.image.storage
+        for width in (150, 300, 600):
+            name = thumbnail_name(image.image.name, width, 'WEBP')
+            self.assertRegex(name, rf'^products/images/[0-9a-f]{{2}}/thumbnails/[0-9a-f]{{64}}_{width}w\.webp$')
+            with storage.open(name) as thumbnail, Image.open(thumbnail) as opened:
+                self.assertEquals(opened.format, 'WEBP')
+                self.assertEquals(opened.size, (width, width // 2))
+                self.assertEquals(opened.mode, 'RGBA')
+
+        # список URL уже в кэше - хранилище больше не нужно
+        with patch.object(storage, 'open', side_effect=AssertionError):
+            urls = get_thumbnails(image.image)
+        self.assertEquals([width for _, width in urls], [150, 300, 600, 800])
+
+    def test_lazy_thumbnails_and_srcset_tag(self):
+        image = ProductImage(product=self.product)
+        image.image.save('small.jpg', self.image_file('small.jpg', (200, 100)), save=False)
+        ProductImage.objects.bulk_create([image])
+
+        html = Template("{% load thumbnails %}<img {% srcset image.image '300px' %}>").render(Context({'image': image}))
+        thumbnail_url = image.image.storage.url(thumbnail_name(image.image.name, 150, 'WEBP'))
+        self.assertInHTML(
+            f'<img src="{thumbnail_url}" srcset="{thumbnail_url} 150w, {image.image.url} 200w" sizes="300px">',
+            html,
+        )
+
+    def test_missing_file_falls_back_to_original(self):
+        image = ProductImage.objects.create(product=self.product, image='products/missing.jpg')
+        html = Template("{% load thumbnails %}<img {% srcset image.image %}>").render(Context({'image': image}))
+        self.assertInHTML(f'<img src="{image.image.url}">', html)
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self) -> None:
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_new_products_get_hashed_preview_names(self):
+        content = b'same preview'
+        digest = hashlib.sha256(content).hexdigest()
+        first = Product.objects.create(name='First', preview=SimpleUploadedFile('Photo.JPG', content))
+        second = Product.objects.create(name='Second', preview=SimpleUploadedFile('other.JPG', content))
+        third = Product.objects.create(name='Third', preview=SimpleUploadedFile('Photo.JPG', b'other preview'))
+
+        self.assertEquals(first.preview.name, f'products/preview/{digest[:2]}/{digest}.jpg')
+        self.assertEquals(second.preview.name, first.preview.name)
+        self.assertNotEquals(third.preview.name, first.preview.name)
+        self.assertEquals(first.preview.url, f'{settings.MEDIA_URL}{first.preview.name}')
+        self.assertEquals(os.listdir(os.path.join(self.media_root, 'products/preview', digest[:2])), [f'{digest}.jpg'])
+
+    def test_hex_client_file_names_are_hashed(self):
+        client_name = 'f' * 64 + '.jpg'
+        content = b'not a hash of anything'
+        digest = hashlib.sha256(content).hexdigest()
+        product = Product.objects.create(name='Hex', preview=SimpleUploadedFile(client_name, content))
+        self.assertEquals(product.preview.name, f'products/preview/{digest[:2]}/{digest}.jpg')
+
+    def test_order_receipts_are_deduplicated(self):
+        receipts = [
+            Order.objects.create(receipt=SimpleUploadedFile(f'receipt_{i}.pdf', b'%PDF receipt')).receipt
+            for i in range(2)
+        ]
+        self.assertEquals(receipts[0].name, receipts[1].name)
+        self.assertRegex(receipts[0].name, r'^orders/receipts/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        with receipts[1].open('rb') as receipt:
+            self.assertEquals(receipt.read(), b'%PDF receipt')
+
+
+class UploadHandlersTestCase(TestCase):
+    def setUp(self) -> None:
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(User.objects.create_superuser(username='admin', password='password'))
+
+    def stored_files(self) -> list:
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_oversized_upload_is_not_written(self):
+        response = self.client.post(
+            reverse('requestdatapp:file-uploads'),
+            {'file': SimpleUploadedFile('big.bin', b'x' * (1048576 + 1))},
+        )
+        self.assertEquals(response.status_code, 413)
+        self.assertTemplateUsed(response, 'requestdataapp/error-message.html')
+        self.assertEquals(self.stored_files(), [])
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    @patch.object(ProductViewSet.upload_csv, 'upload_max_size', 64)
+    def test_csv_upload_over_limit(self):
+        data = b'name,description,price,quantity\n' + b'Samsung,Simple phone,444,44\n' * 10
+        response = self.client.post(
+            reverse('shopapp:product-upload-csv'),
+            {'file': SimpleUploadedFile('devices.csv', data, content_type='text/csv')},
+        )
+        self.assertEquals(response.status_code, 413)
+        self.assertEquals(response.json(), {'file': ['File is larger than 64\xa0bytes.']})
+        self.assertFalse(Product.objects.exists())
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=64)
+    def test_form_reports_rejected_image(self):
+        response = self.client.post(reverse('shopapp:product_create'), {
+            'name': 'Camera',
+            'price': 10,
+            'quantity': 1,
+            'preview': SimpleUploadedFile('photo.jpg', b'x' * 100),
+        })
+        self.assertEquals(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'preview', 'File is larger than 64\xa0bytes.')
+        self.assertFalse(Product.objects.exists())
+
+    def test_storage_uses_hash_computed_on_upload(self):
+        buffer = BytesIO()
+        Image.new('RGB', (20, 10)).save(buffer, format='PNG')
+        content = buffer.getvalue()
+        digest = hashlib.sha256(content).hexdigest()
+
+        for memory_size in (len(content) * 10, 0):
+            with self.subTest(memory_size=memory_size), \
+                    override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=memory_size), \
+                    patch('mysite_19.storage.content_hash', side_effect=AssertionError):
+                response = self.client.post(reverse('shopapp:product_create'), {
+                    'name': f'Camera {memory_size}',
+                    'price': 10,
+                    'quantity': 1,
+                    'preview': SimpleUploadedFile('photo.png', content),
+                })
+                self.assertEquals(response.status_code, 302)
+                product = Product.objects.get(name=f'Camera {memory_size}')
+                self.assertEquals(product.preview.name, f'products/preview/{digest[:2]}/{digest}.png')
@@ -0,0 +1,167 @@
+"""
+Уменьшенные копии изображений: превью и изображения товаров, аватары.
+
+Для каждого загруженного изображения создаются копии шириной из
+THUMBNAIL_WIDTHS (только меньше оригинала) в формате THUMBNAIL_FORMAT
+(WebP, а если Pillow собран без него - JPEG). Копии лежат рядом
+с оригиналом в подкаталоге thumbnails и называются по его имени::
+
+    products/preview/3f/3fa1...9c.jpg
+    products/preview/3f/thumbnails/3fa1...9c_150w.webp
+    products/preview/3f/thumbnails/3fa1...9c_300w.webp
+
+Имя оригинала - SHA-256 содержимого (mysite_19.storage), поэтому копии
+тоже никогда не меняются и сохраняются под этими же именами через
+ContentAddressedStorage.save_derivative().
+
+Копии создаются после загрузки нового файла (в пуле фоновых задач
+:mod:`shopapp.jobs`, см. register_image_fields()), а недостающие - при
+первом обращении через get_thumbnails(). Список URL копий хранится в
+кэше, так что страница со списком не обращается к хранилищу файлов.
+В шаблонах - тег {% srcset %} из библиотеки thumbnails.
+"""
+
+import logging
+import posixpath
+from functools import partial
+from hashlib import md5
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from PIL import Image, ImageOps, features
+
+from .jobs import get_executor
+
+log = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = (150, 300, 600)
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_QUALITY = 80
+URLS_CACHE_TIMEOUT = 60 * 60 * 24
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+
+def get_widths() -> list:
+    return sorted(getattr(settings, 'THUMBNAIL_WIDTHS', THUMBNAIL_WIDTHS))
+
+
+def get_format() -> str:
+    image_format = getattr(settings, 'THUMBNAIL_FORMAT', THUMBNAIL_FORMAT).upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def thumbnail_name(name: str, width: int, image_format: str) -> str:
+    """Имя копии файла name шириной width."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'thumbnails', f'{stem}_{width}w.{EXTENSIONS[image_format]}')
+
+
+def urls_cache_key(name: str) -> str:
+    return f'thumbnails:{md5(name.encode()).hexdigest()}'
+
+
+def encode_thumbnail(image: Image.Image, width: int, image_format: str) -> bytes:
+    thumbnail = image.copy()
+    thumbnail.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+    has_alpha = thumbnail.mode in ('RGBA', 'LA') or 'transparency' in thumbnail.info
+    if image_format == 'JPEG' or not has_alpha:
+        thumbnail = thumbnail.convert('RGB')
+    else:
+        thumbnail = thumbnail.convert('RGBA')
+
+    buffer = BytesIO()
+    thumbnail.save(buffer, format=image_format, quality=getattr(settings, 'THUMBNAIL_QUALITY', THUMBNAIL_QUALITY))
+    return buffer.getvalue()
+
+
+def make_thumbnails(file) -> list:
+    """
+    [(имя, ширина)] копий файла file (FieldFile), от меньшей к большей,
+    и в конце сам оригинал. Недостающие копии создаются.
+    """
+    storage = file.storage
+    image_format = get_format()
+    with storage.open(file.name, 'rb') as source, Image.open(source) as original:
+        # снимки с телефонов повёрнуты через EXIF, копии сохраняются уже без него
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    thumbnails = []
+    for width in get_widths():
+        if width >= image.width:
+            break
+        name = thumbnail_name(file.name, width, image_format)
+        if not storage.exists(name):
+            # у старых файлов (до mysite_19.storage) хранилище может быть обычным
+            save = getattr(storage, 'save_derivative', storage.save)
+            name = save(name, ContentFile(encode_thumbnail(image, width, image_format)))
+        thumbnails.append((name, width))
+    thumbnails.append((file.name, image.width))
+    return thumbnails
+
+
+def get_thumbnails(file) -> list:
+    """
+    [(URL, ширина)] копий файла file и самого оригинала - для srcset.
+
+    Результат кэшируется по имени файла: новое изображение загружается
+    под новым именем, так что устаревших записей не бывает. Если файла
+    нет или он не открывается как изображение, возвращается (и тоже
+    кэшируется) пустой список.
+    """
+    if not file:
+        return []
+    key = urls_cache_key(file.name)
+    urls = cache.get(key)
+    if urls is None:
+        try:
+            urls = [(file.storage.url(name), width) for name, width in make_thumbnails(file)]
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            log.warning('Cannot make thumbnails for %s: %s', file.name, exc)
+            urls = []
+        cache.set(key, urls, URLS_CACHE_TIMEOUT)
+    return urls
+
+
+def remember_new_images(sender, instance, field_names=(), **kwargs):
+    # только что загруженный файл ещё не сохранён в хранилище (_committed = False)
+    instance._new_images = [
+        name for name in field_names
+        if getattr(instance, name) and not getattr(instance, name)._committed
+    ]
+
+
+def create_new_thumbnails(sender, instance, **kwargs):
+    for name in getattr(instance, '_new_images', ()):
+        create = partial(get_thumbnails, getattr(instance, name))
+        if getattr(settings, 'SHOP_JOBS_EAGER', False):
+            transaction.on_commit(create)
+        else:
+            transaction.on_commit(lambda create=create: get_executor().submit(create))
+    instance._new_images = []
+
+
+def register_image_fields(model, *field_names) -> None:
+    """Создавать копии изображений из полей field_names модели model сразу после загрузки."""
+    pre_save.connect(
+        partial(remember_new_images, field_names=field_names),
+        sender=model,
+        weak=False,
+        dispatch_uid=f'thumbnails_pre_save_{model._meta.label_lower}',
+    )
+    post_save.connect(
+        create_new_thumbnails,
+        sender=model,
+        dispatch_uid=f'thumbnails_post_save_{model._meta.label_lower}',
+    )
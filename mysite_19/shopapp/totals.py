@@ -0,0 +1,77 @@
+"""
+Денормализованные итоги заказа: Order.total и Order.items_count.
+
+Итоги считаются по позициям заказа (OrderItem: quantity * unit_price,
+цена зафиксирована на момент покупки) и пересчитываются сигналами из
+:mod:`shopapp.signals` при изменении позиций затронутых заказов, поэтому
+списки заказов сортируются и фильтруются по сумме без JOIN. Пути в обход
+сигналов (queryset.update(), bulk_update, сырой SQL) итоги не обновляют,
+для них есть команда ``manage.py order_totals``, которая пересчитывает
+итоги пачками и показывает расхождения.
+"""
+
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+
+from .caching import ORDERS, bump_generation
+from .models import Order, OrderItem
+
+ZERO = Decimal('0.00')
+LINE_TOTAL_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def compute_order_totals(order_ids) -> dict:
+    """Итоги {order_id: (total, items_count)}, посчитанные по позициям заказов одним запросом."""
+    order_ids = list(order_ids)
+    totals = dict.fromkeys(order_ids, (ZERO, 0))
+    rows = (
+        OrderItem.objects
+        .filter(order_id__in=order_ids)
+        .values('order_id')
+        .annotate(
+            total=Sum(F('quantity') * F('unit_price'), default=ZERO, output_field=LINE_TOTAL_FIELD),
+            items_count=Sum('quantity'),
+        )
+        .order_by()
+        .values_list('order_id', 'total', 'items_count')
+    )
+    for order_id, total, items_count in rows:
+        totals[order_id] = (total, items_count)
+    return totals
+
+
+def refresh_order_totals(order_ids) -> dict:
+    """Пересчёт и сохранение итогов заказов order_ids, возвращаются новые итоги."""
+    totals = compute_order_totals(order_ids)
+    if totals:
+        # bulk_update не трогает auto_now-поля, updated_at выставляем сами
+        now = timezone.now()
+        Order.objects.bulk_update(
+            [
+                Order(pk=order_id, total=total, items_count=items_count, updated_at=now)
+                for order_id, (total, items_count) in totals.items()
+            ],
+            ['total', 'items_count', 'updated_at'],
+        )
+        bump_generation(ORDERS)
+    return totals
+
+
+def find_stale_totals(order_ids) -> list:
+    """
+    Заказы из order_ids, у которых сохранённые итоги расходятся с позициями.
+
+    Возвращается список (order_id, (total, items_count) сохранённые, ... ожидаемые).
+    """
+    expected = compute_order_totals(order_ids)
+    stale = []
+    for order_id, total, items_count in (
+        Order.objects
+        .filter(pk__in=list(expected))
+        .values_list('pk', 'total', 'items_count')
+    ):
+        if (total, items_count) != expected[order_id]:
+            stale.append((order_id, (total, items_count), expected[order_id]))
+    return stale
@@ -18,14 +18,21 @@ from .views import (
     OrderDeleteView,
     ProductsExportDataView,
     ProductViewSet,
+    OrderViewSet,
+    SalesReportViewSet,
     UserOrdersListView,
     UserOrdersJSONView,
+    JobDownloadView,
+    JobStatusView,
+    CacheStatsView,
 )
 
 app_name = "shopapp"
 
 routers = DefaultRouter()
 routers.register('products', ProductViewSet)
+routers.register('orders', OrderViewSet)
+routers.register('reports', SalesReportViewSet, basename='report')
 
 urlpatterns = [
     # path('', cache_page(60 * 2)(ShopIndexView.as_view()), name='index'),
@@ -46,5 +53,8 @@ urlpatterns = [
     path('orders/<int:pk>/update/', OrderUpdateView.as_view(), name='order_update'),
     path('orders/<int:pk>/delete/', OrderDeleteView.as_view(), name='order_delete'),
     path('users/<int:pk>/orders/', UserOrdersListView.as_view(), name='order_user_list'),
-    path('users/<int:pk>/orders/export/', UserOrdersJSONView.as_view(), name='order_user_json')
+    path('users/<int:pk>/orders/export/', UserOrdersJSONView.as_view(), name='order_user_json'),
+    path('jobs/<uuid:pk>/', JobStatusView.as_view(), name='job_status'),
+    path('jobs/<uuid:pk>/download/', JobDownloadView.as_view(), name='job_download'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
 ]
@@ -5,65 +5,138 @@
 """
 
 import logging
+import posixpath
 from timeit import default_timer
-from csv import DictWriter
 
-from django.core import serializers
 from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch, Sum
 
 from django.contrib.auth.models import Group, User
-from django.http import (HttpResponse,
+from django.http import (FileResponse,
+                         Http404,
+                         HttpResponse,
                          HttpRequest,
                          HttpResponseRedirect,
-                         JsonResponse)
+                         JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.middleware.gzip import GZipMiddleware
 from django.views.generic import (ListView,
                                   DetailView,
                                   CreateView,
                                   UpdateView,
                                   DeleteView)
 from django.contrib.auth.mixins import (LoginRequiredMixin,
-                                        PermissionRequiredMixin)
+                                        PermissionRequiredMixin,
+                                        UserPassesTestMixin)
 from django.views import View
 
+from rest_framework import status
 from rest_framework.parsers import MultiPartParser
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.permissions import DjangoModelPermissions, IsAdminUser
+from rest_framework.viewsets import ModelViewSet, ViewSet
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
 
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .serializers import ProductSerializer
+from .serializers import (ProductSerializer,
+                          OrderSerializer,
+                          ReportPeriodSerializer,
+                          DailyRevenueSerializer,
+                          ProductSalesSerializer,
+                          CustomerSalesSerializer)
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
-from .models import Product, Order, ProductImage
+from mysite_19.upload_handlers import UploadErrorsMixin, rejected_uploads, upload_max_size
+
+from .changes import ModifiedSinceFilter
+from .fast_serializers import FastListModelMixin
+from .pagination import KeysetListMixin, KeysetPaginationMixin, approximate_count
+from .search import FullTextSearchFilter
+from .jobs import start_import, start_products_export
+from .orders import aiter_orders_json
+from .models import Product, Order, OrderItem, ProductImage, Job, DailyProductSales, DailyUserSales
 from .forms import GroupForm, ProductForm
-from .common import save_csv_products
+from .caching import ORDERS, PRODUCTS, PRODUCTS_CACHE_TIMEOUT, TWO_TIER_CACHES, exports_cache, request_cache_key
+from .conditional import aget_validators, conditional_get, not_modified_response, set_validators
+from .common import save_csv_products, aiter_json_rows, iter_csv_rows, iter_json_rows, CSV_UPLOAD_MAX_SIZE, UPSERT_KEYS
+from .filters import ProductExportFilter
 
 log = logging.getLogger(__name__)
 
+# сжатие ответа для async-представлений (gzip_page с ними в Django 4.2 не работает)
+gzip_response = GZipMiddleware(lambda request: None).process_response
+
+# Позиции заказов с товарами для HTML-страниц: описание товаров там не показывается
+ORDER_ITEMS = Prefetch(
+    'items',
+    queryset=OrderItem.objects.select_related('product').defer('product__description').order_by('pk'),
+)
+
+
+def job_accepted_response(request: HttpRequest, job: Job) -> JsonResponse:
+    """Ответ 202 с id фоновой задачи и адресом, где смотреть её статус."""
+    status_url = request.build_absolute_uri(
+        reverse('shopapp:job_status', kwargs={'pk': job.pk})
+    )
+    response = JsonResponse(job_as_dict(job, request), status=202)
+    response['Location'] = status_url
+    return response
+
+
+def job_as_dict(job: Job, request: HttpRequest) -> dict:
+    return {
+        'id': str(job.pk),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'result': job.result,
+        'error': job.error,
+        'status_url': request.build_absolute_uri(
+            reverse('shopapp:job_status', kwargs={'pk': job.pk})
+        ),
+        'download_url': (
+            request.build_absolute_uri(reverse('shopapp:job_download', kwargs={'pk': job.pk}))
+            if job.result_file else None
+        ),
+    }
+
+
+def get_user_job(request: HttpRequest, pk) -> Job:
+    """Задача pk, если её видит текущий пользователь (автор или staff), иначе 404."""
+    job = get_object_or_404(Job, pk=pk)
+    if not request.user.is_staff and job.created_by_id != request.user.pk:
+        raise Http404('No Job matches the given query.')
+    return job
+
 
 @extend_schema(description='Product views CRUD')
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(KeysetPaginationMixin, FastListModelMixin, ModelViewSet):
     """
     Набор представлений для действий над Product.
 
-    Полный CRUD для сущностей товара.
+    Полный CRUD для сущностей товара. С ?modified_since= список отдаёт
+    только изменённые товары (см. :mod:`shopapp.changes`). Страницы списка
+    сериализуются из values() без экземпляров моделей (см. :mod:`shopapp.fast_serializers`).
     """
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
     filter_backends = [
-        SearchFilter,
+        FullTextSearchFilter,
         DjangoFilterBackend,
         OrderingFilter,
+        ModifiedSinceFilter,
     ]
+    keyset_query_params = ('modified_since',)
     search_fields = ['name', 'description', ]
 
     filterset_fields = [
@@ -78,34 +151,54 @@ class ProductViewSet(ModelViewSet):
         'name',
         'price',
         'quantity',
+        'updated_at',
     ]
 
-    @method_decorator(cache_page(60 * 1))
-    def list(self, *args, **kwargs):
-        print('Hello products list from cache...')
-        return super().list(*args, **kwargs)
+    @method_decorator(conditional_get(PRODUCTS, vary_on_user=True))
+    def list(self, request: Request, *args, **kwargs):
+        """
+        Список товаров с кэшированием.
+
+        Ключ строится из нормализованных параметров фильтрации и поколения
+        каталога, которое увеличивается при любом изменении товаров.
+        По тому же поколению строится ETag, так что повторный запрос
+        с If-None-Match получает 304 без обращения к базе.
+        """
+        cache_key = request_cache_key(PRODUCTS, request)
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        cache.set(cache_key, response.data, PRODUCTS_CACHE_TIMEOUT)
+        return response
 
     @action(methods=['get', ], detail=False)
     def download_csv(self, request: Request):
-        response = HttpResponse(content_type='text/csv')
-        filename = 'products-export.csv'
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        """
+        Выгрузка отфильтрованных товаров в CSV.
+
+        Ответ отдаётся потоком: строки читаются из БД пачками,
+        так что первый байт уходит сразу, а память не зависит от размера каталога.
+        С параметром background=1 выгрузка уходит в фоновую задачу,
+        а в ответ возвращается её id.
+        """
         queryset = self.filter_queryset(self.get_queryset())
         fields = [
             'name',
             'price',
             'quantity',
         ]
-        queryset = queryset.only(*fields)
-        writer = DictWriter(response, fieldnames=fields)
-        writer.writeheader()
-
-        for product in queryset:
-            writer.writerow({
-                field: getattr(product, field)
-                for field in fields
-            })
+        if request.query_params.get('background'):
+            job = start_products_export(queryset, fields, user=request.user)
+            return job_accepted_response(request, job)
 
+        response = StreamingHttpResponse(
+            iter_csv_rows(queryset, fields),
+            content_type='text/csv',
+        )
+        filename = 'products-export.csv'
+        response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
     @action(
@@ -113,13 +206,44 @@ class ProductViewSet(ModelViewSet):
         methods=['post', ],
         parser_classes=[MultiPartParser],
     )
+    @upload_max_size(CSV_UPLOAD_MAX_SIZE)
     def upload_csv(self, request: Request):
-        products = save_csv_products(
+        """
+        Загрузка товаров из CSV.
+
+        С параметром upsert_key (например, name) существующие товары
+        обновляются, а не дублируются. С background=1 импорт идёт в фоне.
+        """
+        if 'file' not in request.FILES:
+            rejected = rejected_uploads(request).get('file')
+            return Response(
+                {'file': [rejected or 'No file was submitted.']},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if rejected else status.HTTP_400_BAD_REQUEST,
+            )
+
+        upsert_key = request.query_params.get('upsert_key') or request.data.get('upsert_key')
+        if upsert_key and upsert_key not in UPSERT_KEYS:
+            return Response(
+                {'upsert_key': [f'Must be one of: {", ".join(UPSERT_KEYS)}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.query_params.get('background'):
+            job = start_import(
+                'import_products',
+                request.FILES['file'],
+                encoding=request.encoding,
+                user=request.user,
+                upsert_key=upsert_key or None,
+            )
+            return job_accepted_response(request, job)
+
+        result = save_csv_products(
             request.FILES['file'].file,
             encoding=request.encoding,
+            upsert_key=upsert_key or None,
         )
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return Response(result.as_dict())
 
     @extend_schema(
         summary='Get one product by id',
@@ -129,10 +253,138 @@ class ProductViewSet(ModelViewSet):
             404: OpenApiResponse(description='Empty response, product by id not found.'),
         }
     )
+    @method_decorator(conditional_get(PRODUCTS, vary_on_user=True))
     def retrieve(self, *args, **kwargs):
         return super().retrieve(*args, **kwargs)
 
 
+@extend_schema(description='Order views CRUD with bulk creation')
+class OrderViewSet(KeysetPaginationMixin, ModelViewSet):
+    """
+    Набор представлений для действий над Order.
+
+    Позиции заказа передаются списком items: [{"product": id, "quantity": n}],
+    цена позиции фиксируется по текущей цене товара. С ?modified_since=
+    список отдаёт только изменённые заказы (см. :mod:`shopapp.changes`).
+    """
+
+    queryset = (
+        Order.objects
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.order_by('pk')))
+        .order_by('pk')
+    )
+    serializer_class = OrderSerializer
+    permission_classes = [DjangoModelPermissions]
+
+    filter_backends = [
+        DjangoFilterBackend,
+        OrderingFilter,
+        ModifiedSinceFilter,
+    ]
+    keyset_query_params = ('modified_since',)
+    filterset_fields = [
+        'user',
+        'promocode',
+    ]
+    ordering_fields = [
+        'created_at',
+        'updated_at',
+        'total',
+        'items_count',
+    ]
+
+    @extend_schema(
+        summary='Create many orders at once',
+        request=OrderSerializer(many=True),
+        responses={201: OpenApiResponse(description='Number and ids of the created orders.')},
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request: Request):
+        """
+        Создание списка заказов одним запросом.
+
+        Все заказы проверяются до записи (товары и пользователи - одним
+        IN-запросом на таблицу), и при любой ошибке не создаётся ни один;
+        ошибки возвращаются списком по заказам. Заказы и позиции
+        вставляются через bulk_create в одной транзакции.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        orders = serializer.save()
+        return Response(
+            {'created': len(orders), 'ids': [order.pk for order in orders]},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+@extend_schema(description='Sales reports built from the daily rollup tables')
+class SalesReportViewSet(ViewSet):
+    """
+    Отчёты по продажам.
+
+    Читают только свёртки DailyProductSales / DailyUserSales
+    (обновляются командой refresh_rollups), а не заказы, поэтому отчёт
+    за год - это агрегация нескольких сотен строк по индексу дня.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get_period(self, request: Request) -> dict:
+        serializer = ReportPeriodSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @staticmethod
+    def totals():
+        return {
+            'orders_count': Sum('orders_count'),
+            'units': Sum('units'),
+            'revenue': Sum('revenue'),
+        }
+
+    @extend_schema(parameters=[ReportPeriodSerializer], responses=DailyRevenueSerializer(many=True))
+    @action(detail=False)
+    def revenue(self, request: Request):
+        """Выручка, число заказов и единиц товара по дням."""
+        period = self.get_period(request)
+        rows = (
+            DailyUserSales.objects
+            .filter(day__range=(period['start'], period['end']))
+            .values('day')
+            .annotate(**self.totals())
+            .order_by('day')
+        )
+        return Response(DailyRevenueSerializer(rows, many=True).data)
+
+    @extend_schema(parameters=[ReportPeriodSerializer], responses=ProductSalesSerializer(many=True))
+    @action(detail=False)
+    def products(self, request: Request):
+        """Самые продаваемые товары за период."""
+        period = self.get_period(request)
+        rows = (
+            DailyProductSales.objects
+            .filter(day__range=(period['start'], period['end']))
+            .values('product_id', 'product__name')
+            .annotate(**self.totals())
+            .order_by(f'-{period["order_by"]}', 'product_id')
+        )[:period['limit']]
+        return Response(ProductSalesSerializer(rows, many=True).data)
+
+    @extend_schema(parameters=[ReportPeriodSerializer], responses=CustomerSalesSerializer(many=True))
+    @action(detail=False)
+    def customers(self, request: Request):
+        """Покупатели с наибольшими покупками за период."""
+        period = self.get_period(request)
+        rows = (
+            DailyUserSales.objects
+            .filter(day__range=(period['start'], period['end']), user__isnull=False)
+            .values('user_id', 'user__username')
+            .annotate(**self.totals())
+            .order_by(f'-{period["order_by"]}', 'user_id')
+        )[:period['limit']]
+        return Response(CustomerSalesSerializer(rows, many=True).data)
+
+
 class ShopIndexView(View):
     """Представление для тестовой страницы продуктов."""
 
@@ -159,6 +411,8 @@ class ShopIndexView(View):
 class GroupsListView(View):
     """Отображение групп пользователей с разрешениями возможных действий."""
 
+    query_budget = 3
+
     def get(self, request: HttpRequest) -> HttpResponse:
         """Получение групп пользователей с разрншениями."""
         context = {
@@ -176,24 +430,39 @@ class GroupsListView(View):
         return redirect(request.path)
 
 
-class ProductsListView(ListView):
-    """Получение списка продуктов."""
+class ProductsListView(KeysetListMixin, ListView):
+    """
+    Получение списка продуктов.
+
+    Постранично (keyset, см. :class:`shopapp.pagination.KeysetListMixin`),
+    без описания товаров, которое на странице не показывается, и с
+    приблизительным числом товаров вместо полного COUNT(*).
+    """
 
+    # сессия, пользователь, права (perms в шаблоне) - два запроса, число товаров, товары
+    query_budget = 6
     template_name = 'shopapp/products-list.html'
     context_object_name = 'products'
-    queryset = Product.objects.filter(archived=False)
+    queryset = Product.objects.filter(archived=False).defer('description')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['products_count'], context['products_count_exact'] = approximate_count(self.object_list)
+        return context
 
 
 class ProductDetailsView(DetailView):
     """Детальное отображение продукта."""
 
+    # сессия, пользователь, права - два запроса, товар, изображения
+    query_budget = 6
     template_name = 'shopapp/product_detail.html'
     # model = Product
     queryset = Product.objects.prefetch_related('images')
     context_object_name = 'product'
 
 
-class ProductCreateView(CreateView):
+class ProductCreateView(UploadErrorsMixin, CreateView):
     """Создание нового продукта."""
 
     permission_required = 'shop.add_product'
@@ -207,7 +476,7 @@ class ProductCreateView(CreateView):
         return super().form_valid(form)
 
 
-class ProductUpdateView(UpdateView):
+class ProductUpdateView(UploadErrorsMixin, UpdateView):
     """Обновление продукта."""
 
     model = Product
@@ -247,14 +516,15 @@ class ProductDeleteView(DeleteView):
         return HttpResponseRedirect(success_url)
 
 
-class OrdersListView(LoginRequiredMixin, ListView):
-    """Просмотр списка существующих заказов."""
+class OrdersListView(LoginRequiredMixin, KeysetListMixin, ListView):
+    """Просмотр списка существующих заказов, постранично."""
 
+    query_budget = 4
     context_object_name = 'orders'
     queryset = (
         Order.objects
         .select_related('user')
-        .prefetch_related('products')
+        .prefetch_related(ORDER_ITEMS)
         .all()
     )
 
@@ -262,11 +532,13 @@ class OrdersListView(LoginRequiredMixin, ListView):
 class OrdersDetailView(PermissionRequiredMixin, DetailView):
     """Детализация определённого заказа."""
 
+    # сессия, пользователь, права - два запроса, заказ с покупателем, позиции с товарами
+    query_budget = 6
     permission_required = 'shopapp.view_order'
     queryset = (
         Order.objects
         .select_related('user')
-        .prefetch_related('products')
+        .prefetch_related(ORDER_ITEMS)
     )
 
 
@@ -294,6 +566,9 @@ class OrderUpdateView(UpdateView):
 
 
 class UserOrdersListView(ListView):
+    """Заказы пользователя с позициями: запросы владельца, заказов и позиций с товарами."""
+
+    query_budget = 5
     model = Order
     template_name_suffix = "_user_list"
     context_object_name = 'orders'
@@ -309,27 +584,36 @@ class UserOrdersListView(ListView):
 
     def get_queryset(self):
         self.owner = User.objects.filter(id=self.kwargs['pk']).first()
-        queryset = Order.objects.filter(user_id=self.kwargs['pk']).all()
+        queryset = Order.objects.filter(user_id=self.kwargs['pk']).prefetch_related(ORDER_ITEMS).all()
         return queryset
 
 
 class UserOrdersJSONView(View):
-    def get(self, request, *args, **kwargs):
-        get_object_or_404(User, id=self.kwargs['pk'])
+    """Заказы пользователя в JSON, асинхронно: воркер ASGI не простаивает на запросах к базе и кэшу."""
 
-        cache_key = f"user_{self.kwargs['pk']}_orders_export_data"
-        user_orders_as_json = cache.get(cache_key)
+    async def get(self, request, *args, **kwargs):
+        if not await User.objects.filter(id=self.kwargs['pk']).aexists():
+            raise Http404('No User matches the given query.')
 
-        if not user_orders_as_json:
-            user_orders_as_json = serializers.serialize(
-                'json', Order.objects.
-                filter(user_id=self.kwargs['pk']).
-                order_by('pk').all()
-            )
+        etag, last_modified = await aget_validators(request, ORDERS)
+        response = not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        # ETag меняется вместе с поколением заказов, так что в кэше не останется устаревшего тела
+        cache_key = f"user_{self.kwargs['pk']}_orders_export_data:{etag}"
+        user_orders_as_json = await exports_cache.aget_or_set(cache_key, self.build_orders_json, 120)
 
-            cache.set(cache_key, user_orders_as_json, 120)
+        return set_validators(
+            HttpResponse(user_orders_as_json, content_type='application/json'),
+            etag,
+            last_modified,
+        )
 
-        return HttpResponse(user_orders_as_json, content_type='application/json')
+    async def build_orders_json(self) -> str:
+        """Заказы пользователя в формате сериализатора Django, с products и позициями (items)."""
+        orders = Order.objects.filter(user_id=self.kwargs['pk']).order_by('pk')
+        return ''.join([chunk async for chunk in aiter_orders_json(orders)])
 
 
 class OrderDeleteView(DeleteView):
@@ -340,30 +624,81 @@ class OrderDeleteView(DeleteView):
 
 
 class ProductsExportDataView(View):
-    """Просмотр данных по продуктам."""
+    """
+    Выгрузка товаров в JSON ({"products": [...]}) или с ?format=ndjson - по строке на товар.
+
+    Ответ отдаётся потоком: строки читаются через values().iterator()
+    пачками по chunk_size и сразу пишутся в ответ (и сжимаются gzip, если
+    клиент его принимает), так что выгрузка каталога любого размера не
+    собирается в памяти. Под ASGI используется асинхронный итератор.
+
+    Тело не кладётся в exports_cache: кэш хранит ответ целиком, а выгрузка
+    должна идти потоком. Повторные запросы без изменений в каталоге
+    отсекаются раньше - ответом 304 по ETag, без запросов к базе.
+
+    Фильтры - ProductExportFilter; архивные товары по умолчанию не
+    выгружаются, ?archived=true - только они, пустой ?archived= - все.
+    """
+
+    chunk_size = 2000
+    fields = ['pk', 'name', 'description', 'price', 'quantity']
+
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        params = request.GET.copy()
+        params.setdefault('archived', 'false')
+        filterset = ProductExportFilter(params, queryset=Product.objects.order_by('pk'))
+        if not filterset.is_valid():
+            return JsonResponse(filterset.errors, status=400)
+
+        # ETag различается для каждого набора параметров запроса (см. make_etag)
+        etag, last_modified = await aget_validators(request, PRODUCTS)
+        response = not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        ndjson = request.GET.get('format') == 'ndjson'
+        # под WSGI тело читает сервер в своём потоке, там нужен обычный итератор
+        iter_rows = aiter_json_rows if isinstance(request, ASGIRequest) else iter_json_rows
+        content = iter_rows(
+            filterset.qs,
+            self.fields,
+            chunk_size=self.chunk_size,
+            ndjson=ndjson,
+            key=None if ndjson else 'products',
+        )
+        response = StreamingHttpResponse(content, content_type='application/x-ndjson' if ndjson else 'application/json')
+        return gzip_response(request, set_validators(response, etag, last_modified))
+
+
+class JobStatusView(LoginRequiredMixin, View):
+    """Статус фоновой задачи импорта/экспорта в формате JSON."""
+
+    def get(self, request: HttpRequest, pk) -> JsonResponse:
+        return JsonResponse(job_as_dict(get_user_job(request, pk), request))
+
+
+class JobDownloadView(LoginRequiredMixin, View):
+    """Файл, выгруженный фоновой задачей."""
+
+    def get(self, request: HttpRequest, pk) -> FileResponse:
+        job = get_user_job(request, pk)
+        if not job.result_file:
+            raise Http404('Job has no result file.')
+        return FileResponse(
+            job.result_file.open('rb'),
+            as_attachment=True,
+            filename=posixpath.basename(job.result_file.name),
+        )
+
+
+class CacheStatsView(UserPassesTestMixin, View):
+    """Счётчики попаданий и промахов двухуровневых кэшей текущего процесса."""
+
+    def test_func(self):
+        return self.request.user.is_staff
 
     def get(self, request: HttpRequest) -> JsonResponse:
-        """Отображение продуктов в формате JSON."""
-
-        cache_key = 'products_export_data'
-        products_data = cache.get(cache_key)
-        if not products_data:
-            products = Product.objects.order_by('pk').all()
-            products_data = [
-                {
-                    'pk': product.pk,
-                    'name': product.name,
-                    'description': product.description,
-                    'price': product.price,
-                    'quantity': product.quantity,
-
-                }
-                for product in products
-            ]
-            elem = products_data[0]
-            name = elem['name']
-            print('name =', name)
-
-            cache.set(cache_key, products_data, 60)
-
-        return JsonResponse({'products': products_data})
+        return JsonResponse({
+            name: two_tier_cache.get_stats()
+            for name, two_tier_cache in TWO_TIER_CACHES.items()
+        })